@@ -0,0 +1,138 @@
+import json
+from typing import Iterable, Iterator, List, Tuple, TypedDict
+
+import numpy as np
+
+from dataset_types import DatasetDataEntry
+from transform_plan import EntryArrays, TransformPlan, collate_arrays
+
+
+class NodePrediction(TypedDict):
+    id: str
+    type: str
+    top_k: List[Tuple[str, float]]
+
+
+class GraphPrediction(TypedDict):
+    id: str
+    nodes: List[NodePrediction]
+
+
+class InvalidGraphError(ValueError):
+    """
+    Raised for graphs that cannot be transformed, as opposed to failures of the model.
+    """
+
+
+class BasePredictor:
+    """
+    Predicts the node types of graphs with a trained model.
+    Graphs are transformed one by one and predicted in batches of up to max_batch_nodes nodes.
+    Subclasses compute the logits of a batch with a backend, e.g., PyTorch or onnxruntime.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        plan: TransformPlan,
+        top_k: int = 3,
+        max_batch_nodes: int = 65536,
+    ):
+        self.name = name
+        self.plan = plan
+        self.label_names = plan.label_names
+        self.top_k = top_k
+        self.max_batch_nodes = max_batch_nodes
+
+    def predict_logits(self, arrays: EntryArrays) -> np.ndarray:
+        raise NotImplementedError
+
+    def get_label_name(self, index: int) -> str:
+        if index < len(self.label_names) and self.label_names[index] is not None:
+            return self.label_names[index]
+        return f"Unknown ({index})"
+
+    def predict(
+        self, items: Iterable[Tuple[str, DatasetDataEntry]]
+    ) -> Iterator[GraphPrediction]:
+        batch: List[Tuple[str, DatasetDataEntry]] = []
+        batch_nodes = 0
+        for item in items:
+            batch.append(item)
+            batch_nodes += len(item[1]["nodes"])
+            if batch_nodes >= self.max_batch_nodes:
+                yield from self.predict_batch(batch)
+                batch = []
+                batch_nodes = 0
+        if len(batch) > 0:
+            yield from self.predict_batch(batch)
+
+    def predict_batch(
+        self, items: List[Tuple[str, DatasetDataEntry]]
+    ) -> List[GraphPrediction]:
+        probabilities, indices, node_offsets = self.predict_top_k(
+            [entry for _, entry in items]
+        )
+        label_names = [
+            self.get_label_name(index) for index in range(indices.max(initial=0) + 1)
+        ]
+        # Python lists are much faster to iterate than arrays
+        probabilities, indices = probabilities.tolist(), indices.tolist()
+        predictions: List[GraphPrediction] = []
+        for graph_index, (key, entry) in enumerate(items):
+            start, end = node_offsets[graph_index], node_offsets[graph_index + 1]
+            nodes: List[NodePrediction] = []
+            for node_id, node_probabilities, node_indices in zip(
+                entry["nodes"], probabilities[start:end], indices[start:end]
+            ):
+                top_k = [
+                    (label_names[index], probability)
+                    for index, probability in zip(node_indices, node_probabilities)
+                ]
+                nodes.append({"id": node_id, "type": top_k[0][0], "top_k": top_k})
+            predictions.append({"id": key, "nodes": nodes})
+        return predictions
+
+    def predict_top_k(
+        self, entries: List[DatasetDataEntry]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the top-k probabilities and label indices of all nodes of the graphs,
+        and the offsets of the nodes of each graph.
+        """
+        try:
+            arrays, node_offsets = collate_arrays(
+                [self.plan.transform_entry(entry) for entry in entries]
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            raise InvalidGraphError(f"Invalid graph: {error}") from error
+        probabilities, indices = top_k_probabilities(
+            self.predict_logits(arrays), self.top_k
+        )
+        return probabilities, indices, node_offsets
+
+
+def top_k_probabilities(logits: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probabilities = exp / exp.sum(axis=1, keepdims=True)
+    # Stable, so that ties are ordered by label index
+    indices = np.argsort(-probabilities, axis=1, kind="stable")
+    indices = indices[:, : min(k, logits.shape[1])]
+    return np.take_along_axis(probabilities, indices, axis=1), indices
+
+
+def write_predictions(
+    predictions: Iterable[GraphPrediction], output_file: str
+) -> Tuple[int, int]:
+    """
+    Writes one line of JSON per graph and returns the number of graphs and nodes.
+    """
+    num_graphs = 0
+    num_nodes = 0
+    with open(output_file, "w") as file:
+        for prediction in predictions:
+            file.write(json.dumps(prediction))
+            file.write("\n")
+            num_graphs += 1
+            num_nodes += len(prediction["nodes"])
+    return num_graphs, num_nodes
@@ -0,0 +1,61 @@
+from typing import Iterator, List, Optional
+
+from torch.utils.data import Sampler
+from torch_geometric.data import InMemoryDataset
+from torch_geometric.loader import DataLoader
+
+
+class GraphBatchSampler(Sampler[List[int]]):
+    """
+    Groups consecutive graphs into batches of at most max_graphs graphs and max_nodes nodes.
+    Graphs with more than max_nodes nodes form a batch of their own.
+    """
+
+    def __init__(
+        self,
+        node_counts: List[int],
+        max_graphs: Optional[int] = None,
+        max_nodes: Optional[int] = None,
+    ):
+        self.batches: List[List[int]] = []
+        batch: List[int] = []
+        batch_nodes = 0
+        for index, node_count in enumerate(node_counts):
+            exceeds_graphs = max_graphs is not None and len(batch) >= max_graphs
+            exceeds_nodes = (
+                max_nodes is not None and batch_nodes + node_count > max_nodes
+            )
+            if len(batch) > 0 and (exceeds_graphs or exceeds_nodes):
+                self.batches.append(batch)
+                batch = []
+                batch_nodes = 0
+            batch.append(index)
+            batch_nodes += node_count
+        if len(batch) > 0:
+            self.batches.append(batch)
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self.batches)
+
+    def __len__(self) -> int:
+        return len(self.batches)
+
+
+def get_node_counts(dataset: InMemoryDataset) -> List[int]:
+    # The slices are in dataset order, unlike the node counts that are sorted for printing
+    node_slices = dataset.slices["x"]
+    node_counts = node_slices[1:] - node_slices[:-1]
+    # Subsets of a dataset, e.g., the shards of data-parallel training, only select some graphs
+    return node_counts[list(dataset.indices())].tolist()
+
+
+def create_batch_loader(
+    dataset: InMemoryDataset,
+    max_graphs: Optional[int] = None,
+    max_nodes: Optional[int] = None,
+) -> DataLoader:
+    """
+    Creates a loader of disjoint unions of the graphs of the dataset, in dataset order.
+    """
+    batch_sampler = GraphBatchSampler(get_node_counts(dataset), max_graphs, max_nodes)
+    return DataLoader(dataset, batch_sampler=batch_sampler)
@@ -27,16 +27,14 @@ def method_metrics():
 
 def model_metrics():
     return {
-        # "train": method_metrics(),
-        # "validation": method_metrics(),
+        "train": method_metrics(),
+        "validation": method_metrics(),
         "test": method_metrics(),
     }
 
 
-models = {
-    "gcn": model_metrics(),
-    "gat": model_metrics(),
-}
+# Entries are created for every model that has reports, e.g., gat, gcn, and sgc
+models = {}
 
 metrics = ["f1-score", "precision", "recall", "support"]
 methods = ["weighted avg", "macro avg"]
@@ -54,6 +52,8 @@ for seed_dir in os.listdir(report_dir):
         model_dir_path = os.path.join(seed_dir_path, model_dir)
         if not os.path.isdir(model_dir_path):
             continue
+        if model_dir not in models:
+            models[model_dir] = model_metrics()
         for report_file in os.listdir(model_dir_path):
             report_file_path = os.path.join(model_dir_path, report_file)
             if not os.path.isfile(report_file_path):
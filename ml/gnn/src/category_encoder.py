@@ -1,17 +1,47 @@
+import json
 from typing import Optional, Set
 
 
 class CategoryEncoder:
     def __init__(self):
-        self.category_set: Set[Optional[str]] = set()
+        self.category_set: Set[str] = set()
+        self.categories: list[str] = []
+        self.codes: dict[str, int] = {}
+        # Code of categories that were not seen during fitting
+        self.unknown_code = 1
 
     def freeze(self):
-        self.categories = list(self.category_set)
+        # Sorted, so that the codes do not depend on the hash seed of the process
+        self.categories = sorted(self.category_set)
+        self.codes = {
+            category: index + 1 for index, category in enumerate(self.categories)
+        }
+        self.unknown_code = len(self.categories) + 1
 
     def fit(self, category: Optional[str]):
-        self.category_set.add(category)
+        # None is always encoded as 0, and could not be sorted with the other categories
+        if category is not None:
+            self.category_set.add(category)
 
     def transform(self, category: Optional[str]) -> int:
         if category is None:
             return 0
-        return self.categories.index(category) + 1
+        return self.codes.get(category, self.unknown_code)
+
+    def state_dict(self) -> dict:
+        return {"categories": self.categories}
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        self.category_set = set(state_dict["categories"])
+        self.freeze()
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.state_dict(), file)
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryEncoder":
+        encoder = cls()
+        with open(path, "r") as file:
+            encoder.load_state_dict(json.load(file))
+        return encoder
@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+import torch
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints on a background thread, so that training continues while they are serialized.
+    Checkpoints are written every every_n_epochs epochs, or never if it is None. If a retention limit is configured,
+    only the keep_last most recent and the keep_best checkpoints with the lowest validation loss are retained.
+    """
+
+    def __init__(
+        self,
+        checkpoint_file: str,
+        every_n_epochs: Optional[int] = 1,
+        keep_last: Optional[int] = None,
+        keep_best: Optional[int] = None,
+    ):
+        self.checkpoint_file = checkpoint_file
+        self.every_n_epochs = every_n_epochs
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        # (epoch, validation loss) of the checkpoints written by this writer
+        self.written: List[tuple[int, float]] = []
+        self.error: Optional[BaseException] = None
+        # Bounded, so that snapshots do not pile up in memory if writing is slower than training
+        self.queue: queue.Queue = queue.Queue(maxsize=2)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def should_save(self, epoch: int) -> bool:
+        return (
+            self.every_n_epochs is not None and (epoch + 1) % self.every_n_epochs == 0
+        )
+
+    def submit(self, epoch: int, checkpoint: dict, validation_loss: float) -> None:
+        self.raise_error()
+        self.queue.put((epoch, snapshot(checkpoint), validation_loss))
+
+    def close(self, raise_errors: bool = True) -> Optional[BaseException]:
+        """
+        Waits for the pending checkpoints. A write error is raised, or returned if raise_errors is False,
+        e.g., while another exception is propagating.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if raise_errors:
+            self.raise_error()
+        error = self.error
+        self.error = None
+        return error
+
+    def raise_error(self) -> None:
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def run(self) -> None:
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                epoch, checkpoint, validation_loss = item
+                self.write(epoch, checkpoint)
+                self.written.append((epoch, validation_loss))
+                self.apply_retention()
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def write(self, epoch: int, checkpoint: dict) -> None:
+        path = f"{self.checkpoint_file}.{epoch}"
+        # Written to a temporary file first, so that resuming never reads a partial checkpoint
+        tmp_path = f"{path}.tmp"
+        torch.save(checkpoint, tmp_path)
+        os.replace(tmp_path, path)
+
+    def apply_retention(self) -> None:
+        if self.keep_last is None and self.keep_best is None:
+            return
+        retained = set()
+        if self.keep_last is not None:
+            last = self.written[max(len(self.written) - self.keep_last, 0) :]
+            retained.update(epoch for epoch, _ in last)
+        if self.keep_best is not None:
+            by_loss = sorted(self.written, key=lambda written: written[1])
+            retained.update(epoch for epoch, _ in by_loss[: self.keep_best])
+        for epoch, _ in self.written:
+            if epoch not in retained:
+                remove_checkpoint(f"{self.checkpoint_file}.{epoch}")
+        self.written = [written for written in self.written if written[0] in retained]
+
+
+def snapshot(value: Any) -> Any:
+    """
+    Copies all tensors of a (nested) state dict, so that training can modify them while they are written.
+    """
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    if isinstance(value, dict):
+        return {key: snapshot(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [snapshot(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(snapshot(item) for item in value)
+    return value
+
+
+def copy_state(
+    state_dict: Dict[str, torch.Tensor], target: Optional[Dict[str, torch.Tensor]] = None
+) -> Dict[str, torch.Tensor]:
+    """
+    Copies the tensors of a state dict on their device.
+    If a previous copy is given, its tensors are reused to avoid allocations.
+    """
+    if target is None:
+        return {key: tensor.detach().clone() for key, tensor in state_dict.items()}
+    for key, tensor in state_dict.items():
+        target[key].copy_(tensor.detach())
+    return target
+
+
+def remove_checkpoint(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
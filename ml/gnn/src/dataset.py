@@ -3,13 +3,47 @@ import os
 import numpy as np
 from rich.layout import Layout
 import time
+from typing import List, Literal, Optional, TypeAlias
 import torch
-from torch_geometric.data import InMemoryDataset
+from torch_geometric.data import Data, InMemoryDataset
 
+from dataset_stream import read_entries, read_metadata
 from dataset_types import Dataset, DatasetMetadata
 from feature_transformer import FeatureTransformer
 from layout_proxy import LayoutProxy
-from utils import device, pretty_duration, script_dir, text_padding
+from mmap_cache import is_mmap_cache, load_mmap_cache, save_mmap_cache
+from precision import narrow_features, upcast_features
+from structure import precompute_structure, propagate_features
+from transform_plan import create_prediction_label_names
+from utils import (
+    DatasetCache,
+    code_version,
+    device,
+    pretty_duration,
+    script_dir,
+    text_padding,
+)
+
+
+CacheFormat: TypeAlias = Literal["pickle", "mmap"]
+
+# Cached datasets are invalidated whenever one of these modules changes
+cache_version = code_version(
+    [
+        f"{script_dir}/{module}.py"
+        for module in [
+            "dataset",
+            "category_encoder",
+            "dataset_stream",
+            "feature_fitter",
+            "feature_transformer",
+            "mmap_cache",
+            "precision",
+            "structure",
+            "transform_plan",
+        ]
+    ]
+)
 
 
 def softmax(x):
@@ -19,9 +53,44 @@ def softmax(x):
 
 
 class CM2MLDataset(InMemoryDataset):
-    def __init__(self, name: str, dataset_file: str, layout: Layout):
+    def __init__(
+        self,
+        name: str,
+        dataset_file: str,
+        layout: Layout,
+        streaming: bool = False,
+        cache_format: CacheFormat = "pickle",
+        num_workers: int = 0,
+        feature_transformer: Optional[FeatureTransformer] = None,
+        precompute_structure: bool = False,
+        sgc_num_hops: int = 0,
+        reduced_precision: bool = False,
+    ):
         super().__init__(None)
         self.name = name
+        self.streaming = streaming
+        self.cache_format = cache_format
+        self.num_workers = num_workers
+        # Store the normalized adjacency and self-loops of GCNConv and GATConv, instead of computing them every epoch
+        self.precompute_structure = precompute_structure
+        # Store the node features propagated this many times for SGC models, disabled if 0
+        self.sgc_num_hops = sgc_num_hops
+        # Store the node and edge features with the narrowest exact dtype, they are upcast per graph in get
+        self.reduced_precision = reduced_precision
+        # A fitted transformer is only applied, otherwise a new one is fitted to this dataset
+        self.feature_transformer = feature_transformer or FeatureTransformer()
+        # The codes of applied transformers are part of the cached data
+        cache_variant = (
+            self.feature_transformer.fingerprint()
+            if self.feature_transformer.is_fitted
+            else "fit"
+        )
+        if self.precompute_structure:
+            cache_variant = f"{cache_variant}-structure"
+        if self.sgc_num_hops > 0:
+            cache_variant = f"{cache_variant}-sgc{self.sgc_num_hops}"
+        if self.reduced_precision:
+            cache_variant = f"{cache_variant}-narrow"
 
         # To be initialized in print_label_metrics
         self.top_n = 0
@@ -29,9 +98,17 @@ class CM2MLDataset(InMemoryDataset):
         self.class_weights = []
 
         self.dataset_path = f"{script_dir}/../../.input/{dataset_file}"
-        self.dataset_cache_file = f"{script_dir}/../.cache/{dataset_file}.dataset"
-
-        self.is_cached = os.path.isfile(self.dataset_cache_file)
+        self.dataset_cache = DatasetCache(f"{script_dir}/../.cache", cache_version)
+        if self.cache_format == "mmap":
+            self.dataset_cache_file = self.dataset_cache.entry_path(
+                self.dataset_path, ".mmap", cache_variant
+            )
+            self.is_cached = is_mmap_cache(self.dataset_cache_file)
+        else:
+            self.dataset_cache_file = self.dataset_cache.entry_path(
+                self.dataset_path, ".dataset", cache_variant
+            )
+            self.is_cached = os.path.isfile(self.dataset_cache_file)
 
         title = f"{self.name} / {dataset_file}{' (cached)' if self.is_cached else ''}"
         self.layout_proxy = LayoutProxy(layout, title)
@@ -39,32 +116,120 @@ class CM2MLDataset(InMemoryDataset):
     def load(self):
         dataset_load_start_time = time.perf_counter()
         if self.is_cached:
-            self.data, self.slices, self.num_nodes, self.metadata, self.node_counts, self.num_nodes, self.actual_num_classes = torch.load(
-                self.dataset_cache_file
-            )
+            self.load_cache()
             self.to(device)
         else:
-            with open(self.dataset_path, "r") as file:
-                dataset_input: Dataset = json.load(file)
-                data = dataset_input["data"]
-                self.metadata = dataset_input["metadata"]
-                self.actual_num_classes = find_actual_num_classes(self.metadata)
-                data_entries = FeatureTransformer().fit_transform(data, self.metadata)
-                base_data, slices = self.collate(data_entries)
-                self.node_counts = [len(data.x) for data in data_entries]
-                self.num_nodes = sum(self.node_counts)
-                torch.save(
-                    (base_data, slices, self.num_nodes, self.metadata, self.node_counts, self.num_nodes, self.actual_num_classes),
-                    self.dataset_cache_file,
-                )
-                self.data, self.slices = base_data, slices
-                self.to(device)
+            if self.streaming:
+                data_entries = self.read_data_entries_streaming()
+            else:
+                data_entries = self.read_data_entries()
+            if self.precompute_structure:
+                data_entries = [precompute_structure(data) for data in data_entries]
+            if self.sgc_num_hops > 0:
+                data_entries = [
+                    propagate_features(data, self.sgc_num_hops) for data in data_entries
+                ]
+            self.actual_num_classes = find_actual_num_classes(self.metadata)
+            base_data, slices = self.collate(data_entries)
+            self.node_counts = [len(data.x) for data in data_entries]
+            self.num_nodes = sum(self.node_counts)
+            self.label_occurrences = torch.bincount(base_data.y).tolist()
+            # Labels of raw type attributes are the sorted codes of the fitted encoder, not those of the metadata
+            self.label_names = create_prediction_label_names(
+                self.metadata, self.feature_transformer.node_feature_fitter
+            )
+            if self.reduced_precision:
+                base_data = narrow_features(base_data)
+            self.save_cache(base_data, slices)
+            self.data, self.slices = base_data, slices
+            self.to(device)
+        self.dataset_cache.mark_used(self.dataset_cache_file)
 
         dataset_load_end_time = time.perf_counter()
         self.layout_proxy.print(
             f"Processed in {pretty_duration(dataset_load_end_time - dataset_load_start_time)}"
         )
 
+    def load_cache(self) -> None:
+        if self.cache_format == "mmap":
+            # Tensors are memory-mapped instead of unpickled, so loading is almost free
+            # and concurrent runs share the same pages
+            self.data, self.slices, info = load_mmap_cache(self.dataset_cache_file)
+        else:
+            self.data, self.slices, info = torch.load(self.dataset_cache_file)
+        self.metadata = info["metadata"]
+        self.node_counts = info["node_counts"]
+        self.num_nodes = info["num_nodes"]
+        self.actual_num_classes = info["actual_num_classes"]
+        self.label_occurrences = info["label_occurrences"]
+        self.label_names = info["label_names"]
+        if not self.feature_transformer.is_fitted:
+            self.feature_transformer.load_state_dict(info["feature_transformer"])
+
+    def save_cache(self, base_data: Data, slices: dict[str, torch.Tensor]) -> None:
+        info = {
+            "metadata": self.metadata,
+            "node_counts": self.node_counts,
+            "num_nodes": self.num_nodes,
+            "actual_num_classes": self.actual_num_classes,
+            "label_occurrences": self.label_occurrences,
+            "label_names": self.label_names,
+            "feature_transformer": self.feature_transformer.state_dict(),
+        }
+        if self.cache_format == "mmap":
+            save_mmap_cache(self.dataset_cache_file, base_data, slices, info)
+        else:
+            torch.save((base_data, slices, info), self.dataset_cache_file)
+
+    def get(self, idx: int) -> Data:
+        data = super().get(idx)
+        if self.reduced_precision:
+            # The separated graphs that InMemoryDataset keeps are views of the narrow tensors, only the returned copy is upcast
+            data = upcast_features(data)
+        return data
+
+    def share_memory(self):
+        # Moves the tensors to shared memory, so that worker processes receive them without copies.
+        # Memory-mapped tensors of the cache are privately mapped and cannot be sent as they are.
+        if self.is_cached and self.cache_format == "mmap":
+            self._data = self._data.apply(copy_to_shared_memory)
+            self.slices = {
+                key: copy_to_shared_memory(tensor) for key, tensor in self.slices.items()
+            }
+        else:
+            self._data.share_memory_()
+            for tensor in self.slices.values():
+                tensor.share_memory_()
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The separated graphs are cached lazily and would be copied instead of shared
+        state["_data_list"] = None
+        return state
+
+    def read_data_entries(self) -> List[Data]:
+        with open(self.dataset_path, "r") as file:
+            dataset_input: Dataset = json.load(file)
+        self.metadata = dataset_input["metadata"]
+        if not self.feature_transformer.is_fitted:
+            self.feature_transformer.fit(dataset_input["data"].values(), self.metadata)
+        return self.feature_transformer.transform(
+            dataset_input["data"].values(), self.metadata, num_workers=self.num_workers
+        )
+
+    def read_data_entries_streaming(self) -> List[Data]:
+        # Up to two passes over the input file, one for fitting and one for transforming.
+        # Only a single raw graph is held in memory at any time.
+        self.metadata = read_metadata(self.dataset_path)
+        if not self.feature_transformer.is_fitted:
+            self.feature_transformer.fit(read_entries(self.dataset_path), self.metadata)
+        return self.feature_transformer.transform(
+            read_entries(self.dataset_path),
+            self.metadata,
+            num_workers=self.num_workers,
+        )
+
     def print_metrics(self):
         self.layout_proxy.print(f"{text_padding}# graphs: {len(self)}")
         self.layout_proxy.print(f"{text_padding}# node features: {self.num_features}")
@@ -90,8 +255,8 @@ class CM2MLDataset(InMemoryDataset):
         return self
 
     def print_and_calculate_label_metrics(self, max_num_classes: int):
-        self.layout_proxy.print("Counting label occurrences...")
-        occurrences = [sum(self._data.y == i).item() for i in range(self.num_classes)]
+        # The occurrences are counted once while processing the dataset and are part of the cache
+        occurrences = self.label_occurrences
         total_occurrences = sum(occurrences)
         if total_occurrences != self.num_nodes:
             raise ValueError(
@@ -99,6 +264,7 @@ class CM2MLDataset(InMemoryDataset):
             )
         average = total_occurrences / len(occurrences)
         median = occurrences[len(occurrences) // 2]
+        self.layout_proxy.print("Label occurrences:")
         self.layout_proxy.print(f"{text_padding}avg: {average:.2f}")
         self.layout_proxy.print(f"{text_padding}med: {median}")
         min_occurrences, min_index = min(
@@ -126,21 +292,15 @@ class CM2MLDataset(InMemoryDataset):
         return self
 
     def get_label_name_by_index(self, index: int) -> str:
-        node_features = self.metadata["nodeFeatures"]
-        if index == 0:
-            return "None"
-        label_feature_index = None
-        for i, feature in enumerate(node_features):
-            if feature[0] in self.metadata["typeAttributes"]:
-                label_feature_index = i
-                break
-        if label_feature_index is None:
-            raise ValueError("No label feature index found")
-        feature = node_features[label_feature_index]
-        for key, value in feature[2].items():
-            if value == index:
-                return key
-        raise ValueError(f"No label found for value index {index} of feature {feature[0]}")
+        if index < len(self.label_names) and self.label_names[index] is not None:
+            return self.label_names[index]
+        # E.g., the reserved code of categories that are unknown to the fitted encoders
+        return f"Unknown ({index})"
+
+
+def copy_to_shared_memory(tensor: torch.Tensor) -> torch.Tensor:
+    return torch.empty_like(tensor).share_memory_().copy_(tensor)
+
 
 def find_actual_num_classes(metadata: DatasetMetadata) -> int:
     main_type_attribute = metadata["typeAttributes"][0]
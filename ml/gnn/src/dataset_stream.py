@@ -0,0 +1,24 @@
+from typing import Iterator, Tuple
+
+import ijson
+
+from dataset_types import DatasetDataEntry, DatasetMetadata
+
+
+def read_metadata(dataset_path: str) -> DatasetMetadata:
+    with open(dataset_path, "rb") as file:
+        for metadata in ijson.items(file, "metadata", use_float=True):
+            return metadata
+    raise ValueError(f"No metadata found in {dataset_path}")
+
+
+def read_entries(dataset_path: str) -> Iterator[DatasetDataEntry]:
+    for _, entry in read_items(dataset_path):
+        yield entry
+
+
+def read_items(dataset_path: str) -> Iterator[Tuple[str, DatasetDataEntry]]:
+    # Yields one graph at a time, so only a single raw entry is materialized
+    with open(dataset_path, "rb") as file:
+        for key, entry in ijson.kvitems(file, "data", use_float=True):
+            yield key, entry
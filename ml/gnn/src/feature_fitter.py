@@ -25,6 +25,20 @@ class FeatureFitter:
         for _, encoder in self.encoders.items():
             encoder.freeze()
 
+    def state_dict(self) -> dict:
+        return {
+            "encoders": {
+                key: encoder.state_dict() for key, encoder in self.encoders.items()
+            }
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        self.encoders = {}
+        for key, encoder_state in state_dict["encoders"].items():
+            encoder = CategoryEncoder()
+            encoder.load_state_dict(encoder_state)
+            self.encoders[key] = encoder
+
     def fit(
         self,
         data: DatasetData,
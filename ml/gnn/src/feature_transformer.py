@@ -1,8 +1,14 @@
-from typing import List, Optional
+from collections import deque
+import hashlib
+import json
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
 import torch
 from torch_geometric.data import Data
 
 from feature_fitter import FeatureFitter
+from transform_plan import EntryArrays, TransformPlan
 
 from dataset_types import (
     DatasetData,
@@ -10,9 +16,6 @@ from dataset_types import (
     DatasetMetadata,
     FeatureMetadata,
     FeatureSource,
-    FeatureType,
-    ProcessedFeatureVector,
-    RawFeatureVector,
 )
 
 
@@ -21,148 +24,133 @@ class FeatureTransformer:
         super().__init__()
         self.node_feature_fitter = FeatureFitter("nodeFeatureVectors")
         self.edge_feature_fitter = FeatureFitter("edgeFeatureVectors")
+        self.is_fitted = False
 
     def get_fitter(self, source: FeatureSource) -> FeatureFitter:
         if source == "nodeFeatureVectors":
             return self.node_feature_fitter
         return self.edge_feature_fitter
 
-    def fit_transform(
-        self, datasetData: DatasetData, metadata: DatasetMetadata
+    def fit(
+        self, entries: Iterable[DatasetDataEntry], metadata: DatasetMetadata
+    ) -> None:
+        fit_node_features = not is_fully_encoded(metadata["nodeFeatures"])
+        fit_edge_features = not is_fully_encoded(metadata["edgeFeatures"])
+        self.is_fitted = True
+        if not fit_node_features and not fit_edge_features:
+            return
+        for entry in entries:
+            if fit_node_features:
+                self.node_feature_fitter.fit_entry(entry, metadata["nodeFeatures"])
+            if fit_edge_features:
+                self.edge_feature_fitter.fit_entry(entry, metadata["edgeFeatures"])
+        self.node_feature_fitter.freeze()
+        self.edge_feature_fitter.freeze()
+
+    def transform(
+        self,
+        entries: Iterable[DatasetDataEntry],
+        metadata: DatasetMetadata,
+        num_workers: int = 0,
     ) -> List[Data]:
-        all_node_features_encoded = (
-            len(
-                list(
-                    filter(
-                        lambda feature: not feature[1].startswith("encoded-"),
-                        metadata["nodeFeatures"],
-                    )
-                )
-            )
-            == 0
-        )
-        if not all_node_features_encoded:
-            self.node_feature_fitter.fit(datasetData, metadata["nodeFeatures"])
-        all_edge_features_encoded = (
-            len(
-                list(
-                    filter(
-                        lambda feature: not feature[1].startswith("encoded-"),
-                        metadata["edgeFeatures"],
-                    )
-                )
-            )
-            == 0
-        )
-        if not all_edge_features_encoded:
-            self.edge_feature_fitter.fit(datasetData, metadata["edgeFeatures"])
-        type_indices = self.get_type_indices(metadata)
-        entries: List[Data] = []
-        for _, entry in datasetData.items():
-            data = self.transform_entry(
-                entry,
-                metadata,
-                type_indices,
-                all_node_features_encoded=all_node_features_encoded,
-                all_edge_features_encoded=all_edge_features_encoded,
-            )
-            entries.append(data)
-        return entries
-
-    def get_type_indices(self, metadata: DatasetMetadata) -> list[int]:
-        indices = []
-        for i, feature in enumerate(metadata["nodeFeatures"]):
-            if feature[0] in metadata["typeAttributes"]:
-                indices.append(i)
-        return indices
-
-    def transform_entry(
+        if num_workers > 1:
+            return self.transform_parallel(entries, metadata, num_workers)
+        plan = self.compile(metadata)
+        return [arrays_to_data(plan.transform_entry(entry)) for entry in entries]
+
+    def transform_parallel(
         self,
-        entry: DatasetDataEntry,
+        entries: Iterable[DatasetDataEntry],
         metadata: DatasetMetadata,
-        type_indices: List[int],
-        all_node_features_encoded: bool,
-        all_edge_features_encoded: bool,
-    ) -> Data:
-        node_features = entry["nodeFeatureVectors"]
-        if not all_node_features_encoded:
-            for _node_index, feature_vector in enumerate(node_features):
-                self.transform_features(
-                    feature_vector, metadata["nodeFeatures"], "nodeFeatureVectors"
-                )
-        edge_features = entry["edgeFeatureVectors"]
-        if not all_edge_features_encoded:
-            for _edge_index, feature_vector in enumerate(edge_features):
-                self.transform_features(
-                    feature_vector, metadata["edgeFeatures"], "edgeFeatureVectors"
-                )
-        edge_index = entry["list"]
-        actual_types = []
-        for _node_index, features in enumerate(node_features):
-            type = 0
-            for type_index in type_indices:
-                type_value = features[type_index]
-                features[type_index] = 0
-                if type_value != 0:
-                    type = type_value
-                    break
-            actual_types.append(type)
-        y = torch.tensor(actual_types, dtype=torch.long)
-        edge_index = (
-            torch.tensor(edge_index, dtype=torch.long).transpose(0, 1)
-            if len(edge_index) > 0
-            else torch.empty((2, 0), dtype=torch.long)
-        )
-        return Data(
-            x=torch.tensor(node_features, dtype=torch.float),
-            y=y,
-            edge_index=edge_index,
-            edge_attr=torch.tensor(edge_features, dtype=torch.float),
-            # train_mask=train_mask,
+        num_workers: int,
+        chunk_size: int = 64,
+    ) -> List[Data]:
+        # Chunks are collected in submission order, so the result is identical to the serial path.
+        # The number of chunks in flight is bounded to keep memory usage independent of the input size.
+        # The spawn start method, the default on macOS, imports the main module in every worker,
+        # so the calling script must guard its entry point with `if __name__ == "__main__"`.
+        data_entries: List[Data] = []
+        pending: deque[Future] = deque()
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=init_transform_worker,
+            initargs=(self, metadata),
+        ) as executor:
+            for chunk in chunked(entries, chunk_size):
+                pending.append(executor.submit(transform_chunk, chunk))
+                if len(pending) >= 2 * num_workers:
+                    data_entries.extend(map(arrays_to_data, pending.popleft().result()))
+            while len(pending) > 0:
+                data_entries.extend(map(arrays_to_data, pending.popleft().result()))
+        return data_entries
+
+    def fit_transform(
+        self, datasetData: DatasetData, metadata: DatasetMetadata, num_workers: int = 0
+    ) -> List[Data]:
+        self.fit(datasetData.values(), metadata)
+        return self.transform(datasetData.values(), metadata, num_workers=num_workers)
+
+    def state_dict(self) -> dict:
+        return {
+            "node_features": self.node_feature_fitter.state_dict(),
+            "edge_features": self.edge_feature_fitter.state_dict(),
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        self.node_feature_fitter.load_state_dict(state_dict["node_features"])
+        self.edge_feature_fitter.load_state_dict(state_dict["edge_features"])
+        self.is_fitted = True
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.state_dict(), file)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureTransformer":
+        transformer = cls()
+        with open(path, "r") as file:
+            transformer.load_state_dict(json.load(file))
+        return transformer
+
+    def fingerprint(self) -> str:
+        serialized = json.dumps(self.state_dict(), sort_keys=True)
+        return hashlib.sha256(serialized.encode()).hexdigest()[:16]
+
+    def compile(self, metadata: DatasetMetadata) -> TransformPlan:
+        return TransformPlan(
+            metadata, self.node_feature_fitter, self.edge_feature_fitter
         )
 
-    def transform_features(
-        self,
-        feature_vector: RawFeatureVector,
-        metadata: FeatureMetadata,
-        source: FeatureSource,
-    ) -> ProcessedFeatureVector:
-        for feature_index, feature_value in enumerate(feature_vector):
-            _feature_name, feature_type, _ = metadata[feature_index]
-            feature_vector[feature_index] = self.transform_feature(
-                feature_value, feature_index, feature_type, source
-            )
-
-    def transform_feature(
-        self,
-        feature: Optional[str],
-        feature_index: int,
-        feature_type: FeatureType,
-        source: FeatureSource,
-    ) -> int | float:
-        if feature_type.startswith("encoded-"):
-            return feature
-        if feature_type == "category" or feature_type == "string":
-            return self.transform_category_feature(feature, feature_index, source)
-        elif feature_type == "string":
-            return self.transform_string_feature(feature)
-        elif feature_type == "boolean":
-            return self.transform_boolean_feature(feature)
-        elif feature_type == "integer" or feature_type == "float":
-            if feature == "*":
-                return -1
-            return float(feature) if feature is not None else 0
-        else:
-            raise ValueError(f"Unknown feature type: {feature_type}")
-
-    def transform_category_feature(
-        self, feature: Optional[str], feature_index: int, source: FeatureSource
-    ) -> int:
-        encoder = self.get_fitter(source).get_encoder(feature_index)
-        return encoder.transform(feature)
-
-    def transform_string_feature(self, feature: Optional[str]) -> int:
-        return len(feature) if feature is not None else 0
-
-    def transform_boolean_feature(self, feature: Optional[str]) -> int:
-        return 1 if feature == "true" else 0
+
+def is_fully_encoded(feature_metadata: FeatureMetadata) -> bool:
+    return all(feature[1].startswith("encoded-") for feature in feature_metadata)
+
+
+def chunked(
+    entries: Iterable[DatasetDataEntry], chunk_size: int
+) -> Iterator[List[DatasetDataEntry]]:
+    iterator = iter(entries)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+# State of the worker processes of FeatureTransformer.transform_parallel
+worker_plan: Optional[TransformPlan] = None
+
+
+def init_transform_worker(
+    transformer: FeatureTransformer, metadata: DatasetMetadata
+) -> None:
+    global worker_plan
+    # Parallelism comes from the process pool, intra-op threads would only oversubscribe the CPU
+    torch.set_num_threads(1)
+    worker_plan = transformer.compile(metadata)
+
+
+def transform_chunk(chunk: List[DatasetDataEntry]) -> List[EntryArrays]:
+    # Plain arrays are pickled by value, whereas tensors would be sent as shared memory handles
+    return [worker_plan.transform_entry(entry) for entry in chunk]
+
+
+def arrays_to_data(arrays: EntryArrays) -> Data:
+    return Data(**{key: torch.from_numpy(value) for key, value in arrays.items()})
@@ -5,72 +5,143 @@ from rich.console import Console
 from rich.live import Live
 from rich.layout import Layout
 import sys
+from typing import Dict, Optional
 import torch
 
 from dataset import CM2MLDataset
-from utils import script_dir, WaitingSpinner
+from model.base_model import BaseModel
 from model.gat import GATModel
 from model.gcn import GCNModel
-
-seed = sys.argv[4]
-
-if seed is None:
-    exit("Please provide the random seed as an argument")
-
-torch.manual_seed(seed)
-random.seed(seed)
-
-train_dataset_file = sys.argv[1]
-validation_dataset_file = sys.argv[2]
-test_dataset_file = sys.argv[3]
-
-if (
-    train_dataset_file is None
-    or validation_dataset_file is None
-    or test_dataset_file is None
-):
-    exit(
-        "Please provide the train, validation, and test dataset file paths as arguments"
-    )
+from model.sgc import SGCModel
+from training import (
+    fit_and_evaluate,
+    fit_and_evaluate_distributed,
+    fit_and_evaluate_in_parallel,
+)
+from utils import script_dir, WaitingSpinner
 
 num_epochs = 100
 start_epoch = 0
 patience = 10
+# Limits of mini-batches of graphs, graphs are processed one by one if both are None
+batch_max_graphs = None
+batch_max_nodes = None
+# Checkpoints are written in the background every n epochs, or never if None
+checkpoint_every_n_epochs = 1
+# Only the most recent and the best checkpoints by validation loss are kept, all are kept if both are None
+checkpoint_keep_last = 1
+checkpoint_keep_best = 1
+# Evaluate the weights with the lowest validation loss instead of those of the last epoch
+restore_best_state = True
+# Parse the dataset files incrementally to bound memory usage for large inputs
+streaming = False
+# Either "pickle" or "mmap", the latter allows concurrent runs to share the cached tensors
+cache_format = "pickle"
+# Number of worker processes for transforming the features, disabled if at most one.
+# Workers are spawned on macOS and import the main script, which must only train under `if __name__ == "__main__"`
+num_transform_workers = 0
+# Graphs with more nodes are trained and evaluated on sampled neighborhoods of their nodes, which bounds the memory, disabled if None
+sample_min_nodes = None
+# Number of sampled neighbors per layer of GAT and GCN, -1 for all
+sample_num_neighbors = [10, 10]
+# Number of seed nodes per sampled subgraph, the loss is only computed for them
+sample_batch_nodes = 1024
+# Cache the normalized adjacency and self-loops of the graphs, instead of recomputing them in every epoch
+precompute_structure = False
+# Train an SGC baseline next to GAT and GCN, a classifier of node features that are propagated once per dataset
+train_sgc = False
+# Number of times that the node features of SGC are propagated
+sgc_num_hops = 2
+# Hidden channels of the SGC classifier, which is linear if None
+sgc_hidden_channels = None
+# Store integer node and edge features with the narrowest exact dtype, e.g., uint8, in the dataset cache and upcast them per graph
+reduced_precision = False
+# Run the forward passes under bfloat16 autocast on the CPU, which is faster on CPUs with AVX512-BF16 or AMX
+bf16_autocast = False
+# The fitted feature transformer can be used to transform new data without the training dataset
+feature_transformer_file = f"{script_dir}/../.checkpoints/feature-transformer.json"
+# Train the models at the same time in worker processes that share the datasets
+parallel_models = False
+# Threads of each worker process, the available threads are split evenly between the models if None
+num_threads_per_model = None
+# Number of data-parallel processes per model, training is distributed over gloo if greater than one
+num_ranks_per_model = 1
+# Threads of each data-parallel process, the available threads are split evenly between them if None
+num_threads_per_rank = None
+# Record the duration of the training phases and the throughput of each epoch, written next to the reports
+profile_training = False
+# Epochs that are traced with torch.profiler when profiling, e.g., range(1, 3), or None to disable tracing
+profile_trace_epochs = None
 
-layout = Layout()
-layout.split_column(Layout(name="datasets"), Layout(name="models"))
-layout["datasets"].split_row(
-    Layout(WaitingSpinner("train"), name="train"),
-    Layout(WaitingSpinner("validation"), name="validation"),
-    Layout(WaitingSpinner("test"), name="test"),
-)
-layout["models"].split_row(
-    Layout(WaitingSpinner("GAT"), name="gat"),
-    Layout(WaitingSpinner("GCN"), name="gcn"),
-)
 
-with Live(layout, screen=False, redirect_stderr=False, refresh_per_second=4) as live:
+def create_layout() -> Layout:
+    layout = Layout()
+    layout.split_column(Layout(name="datasets"), Layout(name="models"))
+    layout["datasets"].split_row(
+        Layout(WaitingSpinner("train"), name="train"),
+        Layout(WaitingSpinner("validation"), name="validation"),
+        Layout(WaitingSpinner("test"), name="test"),
+    )
+    model_layouts = [
+        Layout(WaitingSpinner("GAT"), name="gat"),
+        Layout(WaitingSpinner("GCN"), name="gcn"),
+    ]
+    if train_sgc:
+        model_layouts.append(Layout(WaitingSpinner("SGC"), name="sgc"))
+    layout["models"].split_row(*model_layouts)
+    return layout
+
+
+def load_datasets(
+    train_dataset_file: str,
+    validation_dataset_file: str,
+    test_dataset_file: str,
+    layout: Layout,
+) -> tuple[CM2MLDataset, CM2MLDataset, CM2MLDataset]:
     train_dataset = CM2MLDataset(
-        "train", train_dataset_file, layout["datasets"]["train"]
+        "train",
+        train_dataset_file,
+        layout["datasets"]["train"],
+        streaming=streaming,
+        cache_format=cache_format,
+        num_workers=num_transform_workers,
+        precompute_structure=precompute_structure,
+        sgc_num_hops=sgc_num_hops if train_sgc else 0,
+        reduced_precision=reduced_precision,
     )
+    train_dataset.load()
+    # The encoders are only fitted to the training data and reused for the other splits
+    feature_transformer = train_dataset.feature_transformer
+    feature_transformer.save(feature_transformer_file)
+
     validation_dataset = CM2MLDataset(
-        "validation", validation_dataset_file, layout["datasets"]["validation"]
+        "validation",
+        validation_dataset_file,
+        layout["datasets"]["validation"],
+        streaming=streaming,
+        cache_format=cache_format,
+        num_workers=num_transform_workers,
+        precompute_structure=precompute_structure,
+        sgc_num_hops=sgc_num_hops if train_sgc else 0,
+        reduced_precision=reduced_precision,
+        feature_transformer=feature_transformer,
+    )
+    test_dataset = CM2MLDataset(
+        "test",
+        test_dataset_file,
+        layout["datasets"]["test"],
+        streaming=streaming,
+        cache_format=cache_format,
+        num_workers=num_transform_workers,
+        precompute_structure=precompute_structure,
+        sgc_num_hops=sgc_num_hops if train_sgc else 0,
+        reduced_precision=reduced_precision,
+        feature_transformer=feature_transformer,
     )
-    test_dataset = CM2MLDataset("test", test_dataset_file, layout["datasets"]["test"])
 
-    train_dataset.load()
     validation_dataset.load()
     test_dataset.load()
 
-    max_num_classes = max(
-        train_dataset.actual_num_classes,
-        validation_dataset.actual_num_classes,
-        test_dataset.actual_num_classes,
-    )
-
-    num_node_features = train_dataset.num_features
-    num_edge_features = train_dataset.num_edge_features
-
     if (
         train_dataset.num_features != validation_dataset.num_features
         or train_dataset.num_features != test_dataset.num_features
@@ -82,65 +153,165 @@ with Live(layout, screen=False, redirect_stderr=False, refresh_per_second=4) as
     ):
         exit("Train, validation or test dataset edge features do not match")
 
-    gat = GATModel(
-        num_node_features=num_node_features,
-        num_edge_features=num_edge_features,
-        hidden_channels=max_num_classes * 2,
-        out_channels=max_num_classes,
-        layout=layout["models"]["gat"],
-    )
-    gcn = GCNModel(
-        num_node_features=num_node_features,
-        hidden_channels=max_num_classes,
-        out_channels=max_num_classes,
-        layout=layout["models"]["gcn"],
-    )
+    return train_dataset, validation_dataset, test_dataset
 
-    train_dataset.print_metrics()
-    validation_dataset.print_metrics()
-    test_dataset.print_metrics()
-
-    train_dataset.print_and_calculate_label_metrics(max_num_classes)
-    validation_dataset.print_and_calculate_label_metrics(max_num_classes)
-    test_dataset.print_and_calculate_label_metrics(max_num_classes)
-
-    # gat.evaluate(
-    #     train_dataset=train_dataset,
-    #     validation_dataset=validation_dataset,
-    #     test_dataset=test_dataset,
-    # )
-    gat.fit(
-        train_dataset=train_dataset,
-        validation_dataset=validation_dataset,
-        num_epochs=num_epochs,
-        start_epoch=start_epoch,
-        patience=patience,
-    )
-    gat_report = gat.evaluate(
-        train_dataset=train_dataset,
-        validation_dataset=validation_dataset,
-        test_dataset=test_dataset,
+
+def get_max_num_classes(
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+) -> int:
+    # Categories that are unknown to the fitted encoders are assigned additional codes
+    return max(
+        train_dataset.actual_num_classes,
+        validation_dataset.actual_num_classes,
+        test_dataset.actual_num_classes,
+        train_dataset.num_classes,
+        validation_dataset.num_classes,
+        test_dataset.num_classes,
     )
 
-    # gcn.evaluate(
-    #     train_dataset=train_dataset,
-    #     validation_dataset=validation_dataset,
-    #     test_dataset=test_dataset,
-    # )
-    gcn.fit(
-        train_dataset=train_dataset,
-        validation_dataset=validation_dataset,
-        num_epochs=num_epochs,
-        start_epoch=start_epoch,
-        patience=patience,
+
+def create_models(
+    num_node_features: int,
+    num_edge_features: int,
+    max_num_classes: int,
+    layout: Layout,
+    checkpoint_dir: Optional[str] = None,
+    output_dir: Optional[str] = None,
+) -> Dict[str, BaseModel]:
+    profile_dir = output_dir if profile_training else None
+    gat = (
+        GATModel(
+            num_node_features=num_node_features,
+            num_edge_features=num_edge_features,
+            hidden_channels=max_num_classes * 2,
+            out_channels=max_num_classes,
+            layout=layout["models"]["gat"],
+        )
+        .use_batches(max_graphs=batch_max_graphs, max_nodes=batch_max_nodes)
+        .use_checkpoints(
+            every_n_epochs=checkpoint_every_n_epochs,
+            keep_last=checkpoint_keep_last,
+            keep_best=checkpoint_keep_best,
+            checkpoint_dir=checkpoint_dir,
+        )
+        .use_best_state(restore_best_state)
+        .use_precomputed_structure(precompute_structure)
+        .use_neighbor_sampling(
+            sample_num_neighbors,
+            min_nodes=sample_min_nodes,
+            batch_nodes=sample_batch_nodes,
+        )
+        .use_bf16_autocast(bf16_autocast)
+        .use_profiler(profile_dir, trace_epochs=profile_trace_epochs)
     )
-    gcn_report = gcn.evaluate(
-        train_dataset=train_dataset,
-        validation_dataset=validation_dataset,
-        test_dataset=test_dataset,
+    gcn = (
+        GCNModel(
+            num_node_features=num_node_features,
+            hidden_channels=max_num_classes,
+            out_channels=max_num_classes,
+            layout=layout["models"]["gcn"],
+        )
+        .use_batches(max_graphs=batch_max_graphs, max_nodes=batch_max_nodes)
+        .use_checkpoints(
+            every_n_epochs=checkpoint_every_n_epochs,
+            keep_last=checkpoint_keep_last,
+            keep_best=checkpoint_keep_best,
+            checkpoint_dir=checkpoint_dir,
+        )
+        .use_best_state(restore_best_state)
+        .use_precomputed_structure(precompute_structure)
+        .use_neighbor_sampling(
+            sample_num_neighbors,
+            min_nodes=sample_min_nodes,
+            batch_nodes=sample_batch_nodes,
+        )
+        .use_bf16_autocast(bf16_autocast)
+        .use_profiler(profile_dir, trace_epochs=profile_trace_epochs)
     )
+    models = {"gat": gat, "gcn": gcn}
+    if train_sgc:
+        models["sgc"] = (
+            SGCModel(
+                num_node_features=num_node_features,
+                out_channels=max_num_classes,
+                num_hops=sgc_num_hops,
+                hidden_channels=sgc_hidden_channels,
+                layout=layout["models"]["sgc"],
+            )
+            .use_batches(max_graphs=batch_max_graphs, max_nodes=batch_max_nodes)
+            .use_checkpoints(
+                every_n_epochs=checkpoint_every_n_epochs,
+                keep_last=checkpoint_keep_last,
+                keep_best=checkpoint_keep_best,
+                checkpoint_dir=checkpoint_dir,
+            )
+            .use_best_state(restore_best_state)
+            # The propagated features already contain the neighborhoods, so only the seeds are needed
+            .use_neighbor_sampling(
+                [], min_nodes=sample_min_nodes, batch_nodes=sample_batch_nodes
+            )
+            .use_bf16_autocast(bf16_autocast)
+            .use_profiler(profile_dir, trace_epochs=profile_trace_epochs)
+        )
+    return models
+
+
+def train_models(
+    models: Dict[str, BaseModel],
+    seed: str,
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+    parallel: Optional[bool] = None,
+) -> Dict[str, dict]:
+    if num_ranks_per_model > 1:
+        return fit_and_evaluate_distributed(
+            models,
+            seed,
+            train_dataset,
+            validation_dataset,
+            test_dataset,
+            num_epochs=num_epochs,
+            start_epoch=start_epoch,
+            patience=patience,
+            world_size=num_ranks_per_model,
+            num_threads_per_rank=num_threads_per_rank,
+        )
+    if parallel if parallel is not None else parallel_models:
+        return fit_and_evaluate_in_parallel(
+            models,
+            seed,
+            train_dataset,
+            validation_dataset,
+            test_dataset,
+            num_epochs=num_epochs,
+            start_epoch=start_epoch,
+            patience=patience,
+            num_threads_per_model=num_threads_per_model,
+        )
+    return {
+        key: fit_and_evaluate(
+            model,
+            seed,
+            train_dataset,
+            validation_dataset,
+            test_dataset,
+            num_epochs=num_epochs,
+            start_epoch=start_epoch,
+            patience=patience,
+        )
+        for key, model in models.items()
+    }
+
+
+def get_output_dir(seed: str) -> str:
+    return f"{script_dir}/../../.output/gnn/{seed}"
+
 
-    output_dir = f"{script_dir}/../../.output/gnn/{seed}"
+def save_output(seed: str, layout: Layout, reports: Dict[str, dict]) -> None:
+    output_dir = get_output_dir(seed)
 
     def save_report(model_name, report):
         report_dir = f"{output_dir}/{model_name}"
@@ -158,5 +329,56 @@ with Live(layout, screen=False, redirect_stderr=False, refresh_per_second=4) as
     os.makedirs(output_dir, exist_ok=True)
     with open(f"{output_dir}/log.txt", "w") as file:
         file.write(output)
-    save_report("gat", gat_report)
-    save_report("gcn", gcn_report)
+    for model_name, report in reports.items():
+        save_report(model_name, report)
+
+
+def main():
+    if len(sys.argv) < 5:
+        exit(
+            "Please provide the train, validation, and test dataset file paths and the random seed as arguments"
+        )
+    train_dataset_file = sys.argv[1]
+    validation_dataset_file = sys.argv[2]
+    test_dataset_file = sys.argv[3]
+    seed = sys.argv[4]
+
+    torch.manual_seed(seed)
+    random.seed(seed)
+
+    layout = create_layout()
+
+    with Live(layout, screen=False, redirect_stderr=False, refresh_per_second=4):
+        train_dataset, validation_dataset, test_dataset = load_datasets(
+            train_dataset_file, validation_dataset_file, test_dataset_file, layout
+        )
+        max_num_classes = get_max_num_classes(
+            train_dataset, validation_dataset, test_dataset
+        )
+
+        models = create_models(
+            num_node_features=train_dataset.num_features,
+            num_edge_features=train_dataset.num_edge_features,
+            max_num_classes=max_num_classes,
+            layout=layout,
+            output_dir=get_output_dir(seed),
+        )
+
+        train_dataset.print_metrics()
+        validation_dataset.print_metrics()
+        test_dataset.print_metrics()
+
+        train_dataset.print_and_calculate_label_metrics(max_num_classes)
+        validation_dataset.print_and_calculate_label_metrics(max_num_classes)
+        test_dataset.print_and_calculate_label_metrics(max_num_classes)
+
+        reports = train_models(
+            models, seed, train_dataset, validation_dataset, test_dataset
+        )
+
+        save_output(seed, layout, reports)
+
+
+# Worker processes are spawned and import this module without running the training
+if __name__ == "__main__":
+    main()
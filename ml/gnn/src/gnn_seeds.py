@@ -0,0 +1,129 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import random
+from rich.console import Console
+import sys
+import time
+from typing import List, Optional
+import torch
+import torch.multiprocessing
+
+from dataset import CM2MLDataset
+import gnn
+from utils import pretty_duration, script_dir
+
+# Number of seeds that are trained at the same time
+max_concurrent_seeds = 2
+# Threads of each seed, the available threads are split evenly between the concurrent seeds if None
+num_threads_per_seed = None
+
+
+class SeedDatasets:
+    def __init__(
+        self,
+        train_dataset: CM2MLDataset,
+        validation_dataset: CM2MLDataset,
+        test_dataset: CM2MLDataset,
+        max_num_classes: int,
+    ):
+        self.train_dataset = train_dataset
+        self.validation_dataset = validation_dataset
+        self.test_dataset = test_dataset
+        self.max_num_classes = max_num_classes
+
+
+# State of the worker processes, the datasets are received once per worker
+worker_datasets: Optional[SeedDatasets] = None
+
+
+def init_seed_worker(datasets: SeedDatasets, num_threads: int) -> None:
+    global worker_datasets
+    torch.set_num_threads(num_threads)
+    worker_datasets = datasets
+
+
+def run_seed(seed: str) -> str:
+    datasets = worker_datasets
+    torch.manual_seed(seed)
+    random.seed(seed)
+
+    layout = gnn.create_layout()
+    # The dataset panels show the lines that were printed while loading them once
+    for dataset in [
+        datasets.train_dataset,
+        datasets.validation_dataset,
+        datasets.test_dataset,
+    ]:
+        dataset.layout_proxy.layout = layout["datasets"][dataset.name]
+        dataset.layout_proxy.render()
+
+    models = gnn.create_models(
+        num_node_features=datasets.train_dataset.num_features,
+        num_edge_features=datasets.train_dataset.num_edge_features,
+        max_num_classes=datasets.max_num_classes,
+        layout=layout,
+        # Concurrent seeds must not overwrite each others checkpoints
+        checkpoint_dir=f"{script_dir}/../.checkpoints/{seed}",
+        output_dir=gnn.get_output_dir(seed),
+    )
+    # The concurrency comes from the seeds, the models of a seed are trained one after another
+    reports = gnn.train_models(
+        models,
+        seed,
+        datasets.train_dataset,
+        datasets.validation_dataset,
+        datasets.test_dataset,
+        parallel=False,
+    )
+    gnn.save_output(seed, layout, reports)
+    return seed
+
+
+def main():
+    if len(sys.argv) < 5:
+        exit(
+            "Please provide the train, validation, and test dataset file paths and at least one random seed as arguments"
+        )
+    train_dataset_file = sys.argv[1]
+    validation_dataset_file = sys.argv[2]
+    test_dataset_file = sys.argv[3]
+    seeds: List[str] = sys.argv[4:]
+
+    console = Console()
+    layout = gnn.create_layout()
+    with console.status("Loading datasets..."):
+        train_dataset, validation_dataset, test_dataset = gnn.load_datasets(
+            train_dataset_file, validation_dataset_file, test_dataset_file, layout
+        )
+    max_num_classes = gnn.get_max_num_classes(
+        train_dataset, validation_dataset, test_dataset
+    )
+    for dataset in [train_dataset, validation_dataset, test_dataset]:
+        dataset.print_metrics()
+        dataset.print_and_calculate_label_metrics(max_num_classes)
+        dataset.share_memory()
+    console.print(layout["datasets"])
+
+    num_workers = min(max_concurrent_seeds, len(seeds))
+    num_threads = num_threads_per_seed or max(1, torch.get_num_threads() // num_workers)
+    datasets = SeedDatasets(
+        train_dataset, validation_dataset, test_dataset, max_num_classes
+    )
+    start_time = time.perf_counter()
+    # Spawned workers receive the datasets as shared memory handles instead of copies
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=torch.multiprocessing.get_context("spawn"),
+        initializer=init_seed_worker,
+        initargs=(datasets, num_threads),
+    ) as executor:
+        futures = [executor.submit(run_seed, seed) for seed in seeds]
+        for future in as_completed(futures):
+            seed = future.result()
+            console.print(
+                f"Seed {seed} finished after {pretty_duration(time.perf_counter() - start_time)}"
+            )
+
+
+# Worker processes are spawned and import this module without running the seeds
+if __name__ == "__main__":
+    main()
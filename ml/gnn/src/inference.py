@@ -0,0 +1,93 @@
+from typing import List, Optional
+
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+from base_predictor import BasePredictor
+from dataset_types import DatasetMetadata
+from feature_transformer import FeatureTransformer
+from model.base_model import BaseModel
+from model.gat import GATModel
+from model.gcn import GCNModel
+from model.sgc import SGCModel
+from transform_plan import EntryArrays
+from utils import device
+
+model_classes = {
+    "GAT": GATModel,
+    "GCN": GCNModel,
+    "SGC": SGCModel,
+}
+
+
+def load_model(checkpoint_file: str) -> BaseModel:
+    checkpoint = torch.load(checkpoint_file, map_location=device, weights_only=True)
+    if "config" not in checkpoint:
+        raise ValueError(
+            f"Checkpoint {checkpoint_file} does not contain the model configuration, retrain the model to create it"
+        )
+    model = model_classes[checkpoint["name"]](**checkpoint["config"], layout=None)
+    model.load_state_dict(checkpoint["model"])
+    return model
+
+
+class Predictor(BasePredictor):
+    """
+    Predicts the node types of graphs with a trained PyTorch model.
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        feature_transformer: FeatureTransformer,
+        metadata: DatasetMetadata,
+        top_k: int = 3,
+        max_batch_nodes: int = 65536,
+        num_neighbors: Optional[List[int]] = None,
+        sample_min_nodes: Optional[int] = None,
+        bf16_autocast: bool = False,
+    ):
+        super().__init__(
+            model.name,
+            feature_transformer.compile(metadata),
+            top_k=top_k,
+            max_batch_nodes=max_batch_nodes,
+        )
+        # Batches with more nodes are predicted from sampled subgraphs
+        self.model = (
+            model.to(device)
+            .use_neighbor_sampling(num_neighbors, min_nodes=sample_min_nodes)
+            .use_bf16_autocast(bf16_autocast)
+        )
+        self.model.eval()
+
+    @classmethod
+    def load(
+        cls,
+        checkpoint_file: str,
+        feature_transformer_file: str,
+        metadata: DatasetMetadata,
+        top_k: int = 3,
+        max_batch_nodes: int = 65536,
+        num_neighbors: Optional[List[int]] = None,
+        sample_min_nodes: Optional[int] = None,
+        bf16_autocast: bool = False,
+    ) -> "Predictor":
+        return cls(
+            load_model(checkpoint_file),
+            FeatureTransformer.load(feature_transformer_file),
+            metadata,
+            top_k=top_k,
+            max_batch_nodes=max_batch_nodes,
+            num_neighbors=num_neighbors,
+            sample_min_nodes=sample_min_nodes,
+            bf16_autocast=bf16_autocast,
+        )
+
+    def predict_logits(self, arrays: EntryArrays) -> np.ndarray:
+        data = Data(
+            **{key: torch.from_numpy(value).to(device) for key, value in arrays.items()}
+        )
+        with torch.inference_mode():
+            return self.model.predict(data).cpu().numpy()
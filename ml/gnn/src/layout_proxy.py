@@ -11,6 +11,33 @@ class LayoutProxy:
 
     def print(self, string: str):
         self.lines.append(string)
-        new_text = "\n".join(self.lines)
-        self.layout.update(Panel(Text(new_text), title=self.title))
+        self.render()
+        return self
+
+    def render(self):
+        if self.layout is not None:
+            new_text = "\n".join(self.lines)
+            self.layout.update(Panel(Text(new_text), title=self.title))
+
+    def __getstate__(self):
+        # The layout is rendered by the main process, other processes only collect the lines
+        state = self.__dict__.copy()
+        state["layout"] = None
+        return state
+
+
+class ForwardingLayoutProxy(LayoutProxy):
+    """
+    Forwards the lines printed in a worker process through a queue to the layout of the main process.
+    """
+
+    def __init__(self, layout_proxy: LayoutProxy, queue, key: str):
+        super().__init__(None, layout_proxy.title)
+        self.lines = layout_proxy.lines
+        self.queue = queue
+        self.key = key
+
+    def print(self, string: str):
+        super().print(string)
+        self.queue.put((self.key, string))
         return self
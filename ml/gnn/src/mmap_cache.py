@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+from typing import Any
+
+import torch
+from torch_geometric.data import Data
+
+metadata_file_name = "metadata.json"
+
+
+def is_mmap_cache(cache_dir: str) -> bool:
+    return os.path.isfile(f"{cache_dir}/{metadata_file_name}")
+
+
+def save_mmap_cache(
+    cache_dir: str, data: Data, slices: dict[str, torch.Tensor], info: dict[str, Any]
+) -> None:
+    # Write into a temporary directory first, so that concurrent readers never observe partial caches
+    tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    metadata = {
+        "tensors": {
+            key: write_tensor(f"{tmp_dir}/{key}.bin", value)
+            for key, value in data.to_dict().items()
+        },
+        "slices": {
+            key: write_tensor(f"{tmp_dir}/{key}.slices.bin", value)
+            for key, value in slices.items()
+        },
+        "info": info,
+    }
+    with open(f"{tmp_dir}/{metadata_file_name}", "w") as file:
+        json.dump(metadata, file)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+
+
+def load_mmap_cache(
+    cache_dir: str,
+) -> tuple[Data, dict[str, torch.Tensor], dict[str, Any]]:
+    with open(f"{cache_dir}/{metadata_file_name}", "r") as file:
+        metadata = json.load(file)
+    tensors = {
+        key: read_tensor(f"{cache_dir}/{key}.bin", descriptor)
+        for key, descriptor in metadata["tensors"].items()
+    }
+    slices = {
+        key: read_tensor(f"{cache_dir}/{key}.slices.bin", descriptor)
+        for key, descriptor in metadata["slices"].items()
+    }
+    return Data(**tensors), slices, metadata["info"]
+
+
+def write_tensor(path: str, tensor: torch.Tensor) -> dict[str, Any]:
+    tensor = tensor.detach().cpu().contiguous()
+    # Stored as raw bytes, which also covers dtypes without a numpy equivalent
+    tensor.reshape(-1).view(torch.uint8).numpy().tofile(path)
+    return {"dtype": str(tensor.dtype).removeprefix("torch."), "shape": list(tensor.shape)}
+
+
+def read_tensor(path: str, descriptor: dict[str, Any]) -> torch.Tensor:
+    dtype = getattr(torch, descriptor["dtype"])
+    shape = descriptor["shape"]
+    numel = 1
+    for size in shape:
+        numel *= size
+    if numel == 0:
+        return torch.empty(shape, dtype=dtype)
+    # Private mappings share the page cache between processes until a page is written to
+    return torch.from_file(path, shared=False, size=numel, dtype=dtype).view(shape)
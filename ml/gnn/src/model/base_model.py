@@ -1,14 +1,20 @@
+import contextlib
+import os
 import time
-from typing import List
-import numpy as np
+from typing import Iterable, Iterator, List, Optional
 import torch
+import torch.distributed
 from rich.layout import Layout
+from torch.nn.parallel import DistributedDataParallel
 from torch_geometric.data import Data
 
+from batching import create_batch_loader, get_node_counts
+from checkpoint import CheckpointWriter, copy_state
 from dataset import CM2MLDataset
 from layout_proxy import LayoutProxy
-from utils import device, pretty_duration, script_dir, text_padding
-from sklearn.metrics import classification_report
+from profiler import TrainingProfiler
+from sampling import NeighborSampler, num_seed_nodes
+from utils import ConfusionMatrix, device, pretty_duration, script_dir, text_padding
 
 
 def accuracy(logits: torch.Tensor, labels: torch.Tensor) -> tuple[torch.Tensor, int]:
@@ -18,44 +24,34 @@ def accuracy(logits: torch.Tensor, labels: torch.Tensor) -> tuple[torch.Tensor,
 
 
 def top_n_accuracy(
-    logits: torch.Tensor, labels: torch.Tensor, top_n_classes: List[int]
-) -> tuple[torch.Tensor, int, torch.Tensor, int]:
+    logits: torch.Tensor, labels: torch.Tensor, top_n_classes: torch.Tensor
+) -> tuple[torch.Tensor, int, torch.Tensor, torch.Tensor]:
     pred = torch.argmax(logits, dim=1)
-    correct_predictions = 0
-    top_n_correct_predictions = 0
-    top_n_prediction_count = 0
-    for i in range(len(pred)):
-        if labels[i] in top_n_classes:
-            top_n_prediction_count += 1
-        if pred[i] == labels[i]:
-            correct_predictions += 1
-            if labels[i] in top_n_classes:
-                top_n_correct_predictions += 1
-
+    is_correct = pred == labels
+    is_top_n = torch.isin(labels, top_n_classes)
     return (
-        correct_predictions,
+        torch.sum(is_correct),
         len(logits),
-        top_n_correct_predictions,
-        top_n_prediction_count,
+        torch.sum(is_correct & is_top_n),
+        torch.sum(is_top_n),
     )
 
 
 def weighted_accuracy(
-    logits: torch.Tensor, labels: torch.Tensor, weights: List[float]
-) -> tuple[torch.Tensor, int, torch.Tensor, int]:
-    weighted_correct_predictions = 0
-    total_weighted_predictions = 0
-    for i in range(len(logits)):
-        pred_index = None
-        max_value = float("-inf")
-        for j in range(len(logits[i])):
-            if logits[i][j] > max_value:
-                max_value = logits[i][j]
-                pred_index = j
-        total_weighted_predictions += weights[pred_index]
-        if pred_index == labels[i]:
-            weighted_correct_predictions += weights[pred_index]
-    return (weighted_correct_predictions, total_weighted_predictions)
+    logits: torch.Tensor, labels: torch.Tensor, weights: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor]:
+    pred = torch.argmax(logits, dim=1)
+    pred_weights = weights[pred]
+    return (
+        torch.sum(pred_weights * (pred == labels)),
+        torch.sum(pred_weights),
+    )
+
+
+def all_reduce_sum(*values) -> List[float]:
+    summed = torch.tensor([float(value) for value in values], dtype=torch.float64)
+    torch.distributed.all_reduce(summed)
+    return summed.tolist()
 
 
 class BaseModel(torch.nn.Module):
@@ -67,18 +63,184 @@ class BaseModel(torch.nn.Module):
         self.name = name
         self.checkpoint_file = f"{script_dir}/../.checkpoints/{name}.pt"
         self.layout_proxy = LayoutProxy(layout, self.name)
+        # Arguments of the constructor, stored in checkpoints to restore the model for inference
+        self.config: dict = {}
+        # Graphs are processed one by one, unless limits for mini-batches are configured
+        self.batch_max_graphs: Optional[int] = None
+        self.batch_max_nodes: Optional[int] = None
+        # By default, a checkpoint is written every epoch and all of them are kept
+        self.checkpoint_every_n_epochs: Optional[int] = 1
+        self.checkpoint_keep_last: Optional[int] = None
+        self.checkpoint_keep_best: Optional[int] = None
+        # The weights with the lowest validation loss are kept in memory and restored after training
+        self.restore_best_state = True
+        # Rank of this process for data-parallel training, each rank trains on a shard of the graphs
+        self.rank = 0
+        self.world_size = 1
+        # Directory of the profiles of the training phases, profiling is disabled if None
+        self.profile_dir: Optional[str] = None
+        self.profile_trace_epochs: Optional[range] = None
+        # Graphs with more than sample_min_nodes nodes are processed as sampled subgraphs, disabled if None
+        self.neighbor_sampler: Optional[NeighborSampler] = None
+        self.sample_min_nodes: Optional[int] = None
+        # Forward passes run under bfloat16 autocast on the CPU, the weights and the optimizer stay in float32
+        self.bf16_autocast = False
 
     def forward(self, data: Data):
         raise NotImplementedError
 
-    def __train(self, data: Data) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        self.optimizer.zero_grad()
-        out = self.forward(data)
-        loss = self.criterion(out, data.y)
-        correct_predictions, prediction_count = accuracy(out, data.y)
-        loss.backward()
-        self.optimizer.step()
-        return loss, correct_predictions, prediction_count
+    def use_batches(
+        self, max_graphs: Optional[int] = None, max_nodes: Optional[int] = None
+    ):
+        self.batch_max_graphs = max_graphs
+        self.batch_max_nodes = max_nodes
+        return self
+
+    def use_checkpoints(
+        self,
+        every_n_epochs: Optional[int] = 1,
+        keep_last: Optional[int] = None,
+        keep_best: Optional[int] = None,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        if checkpoint_dir is not None:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            self.checkpoint_file = f"{checkpoint_dir}/{self.name}.pt"
+        self.checkpoint_every_n_epochs = every_n_epochs
+        self.checkpoint_keep_last = keep_last
+        self.checkpoint_keep_best = keep_best
+        return self
+
+    def use_best_state(self, restore: bool = True):
+        self.restore_best_state = restore
+        return self
+
+    def use_profiler(
+        self, profile_dir: Optional[str], trace_epochs: Optional[range] = None
+    ):
+        self.profile_dir = profile_dir
+        self.profile_trace_epochs = trace_epochs
+        return self
+
+    def use_neighbor_sampling(
+        self,
+        num_neighbors: Optional[List[int]],
+        min_nodes: Optional[int] = None,
+        batch_nodes: int = 1024,
+    ):
+        if num_neighbors is None or min_nodes is None:
+            self.neighbor_sampler = None
+            self.sample_min_nodes = None
+            return self
+        self.neighbor_sampler = NeighborSampler(num_neighbors, batch_nodes=batch_nodes)
+        self.sample_min_nodes = min_nodes
+        return self
+
+    def should_sample(self, num_nodes: int) -> bool:
+        return self.neighbor_sampler is not None and num_nodes > self.sample_min_nodes
+
+    def use_bf16_autocast(self, enabled: bool = True):
+        self.bf16_autocast = enabled
+        return self
+
+    def compute_logits(
+        self, data: Data, module: Optional[torch.nn.Module] = None
+    ) -> torch.Tensor:
+        if module is None:
+            module = self
+        with torch.autocast(
+            "cpu",
+            dtype=torch.bfloat16,
+            enabled=self.bf16_autocast and device.type == "cpu",
+        ):
+            out = module(data)
+        # Losses and metrics are computed in float32
+        return out.float()
+
+    def use_distributed(self, rank: int, world_size: int):
+        self.rank = rank
+        self.world_size = world_size
+        if rank != 0:
+            # Only the first rank writes checkpoints
+            self.checkpoint_every_n_epochs = None
+        return self
+
+    @property
+    def is_distributed(self) -> bool:
+        return self.world_size > 1
+
+    def iterate(
+        self, dataset: CM2MLDataset, shard: bool = False, shuffle: bool = False
+    ) -> Iterable[Data]:
+        if shard and self.is_distributed:
+            dataset = dataset.index_select(
+                range(self.rank, len(dataset), self.world_size)
+            )
+        if self.neighbor_sampler is not None:
+            node_counts = get_node_counts(dataset)
+            large_graphs = [
+                index
+                for index, node_count in enumerate(node_counts)
+                if self.should_sample(node_count)
+            ]
+            if len(large_graphs) > 0:
+                return self.iterate_sampled(dataset, large_graphs, shuffle)
+        return self.iterate_graphs(dataset)
+
+    def iterate_graphs(self, dataset: CM2MLDataset) -> Iterable[Data]:
+        if self.batch_max_graphs is None and self.batch_max_nodes is None:
+            return dataset
+        return create_batch_loader(
+            dataset, max_graphs=self.batch_max_graphs, max_nodes=self.batch_max_nodes
+        )
+
+    def iterate_sampled(
+        self, dataset: CM2MLDataset, large_graphs: List[int], shuffle: bool
+    ) -> Iterator[Data]:
+        """
+        Yields the small graphs like iterate_graphs, followed by the sampled subgraphs of the large graphs.
+        """
+        large_graph_set = set(large_graphs)
+        small_graphs = [
+            index for index in range(len(dataset)) if index not in large_graph_set
+        ]
+        if len(small_graphs) > 0:
+            yield from self.iterate_graphs(dataset.index_select(small_graphs))
+        for index in large_graphs:
+            yield from self.neighbor_sampler.sample(dataset[index], shuffle=shuffle)
+
+    def predict(self, data: Data) -> torch.Tensor:
+        """
+        Returns the logits of all nodes, large graphs are predicted from sampled subgraphs to bound the memory.
+        """
+        if not self.should_sample(data.num_nodes):
+            return self.compute_logits(data)
+        return torch.cat(
+            [
+                self.compute_logits(subgraph)[: subgraph.num_seed_nodes]
+                for subgraph in self.neighbor_sampler.sample(data)
+            ]
+        )
+
+    def __train(
+        self, train_module: torch.nn.Module, data: Data, profiler: TrainingProfiler
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        profiler.count(data)
+        with profiler.phase("optimizer"):
+            self.optimizer.zero_grad()
+        with profiler.phase("forward"):
+            out = self.compute_logits(data, train_module)
+        with profiler.phase("loss"):
+            # Only the seeds of sampled subgraphs have their whole neighborhood
+            num_seeds = num_seed_nodes(data)
+            out, y = out[:num_seeds], data.y[:num_seeds]
+            loss = self.criterion(out, y)
+            correct_predictions, prediction_count = accuracy(out, y)
+        with profiler.phase("backward"):
+            loss.backward()
+        with profiler.phase("optimizer"):
+            self.optimizer.step()
+        return loss.detach(), correct_predictions, prediction_count
 
     def fit(
         self,
@@ -95,38 +257,130 @@ class BaseModel(torch.nn.Module):
         self.to(device)
         self.layout_proxy.print("Training...")
 
+        checkpoint_writer = CheckpointWriter(
+            self.checkpoint_file,
+            every_n_epochs=self.checkpoint_every_n_epochs,
+            keep_last=self.checkpoint_keep_last,
+            keep_best=self.checkpoint_keep_best,
+        )
+        profiler = TrainingProfiler()
+        # Only the first rank writes profiles, like checkpoints
+        if self.profile_dir is not None and self.rank == 0:
+            profiler = TrainingProfiler(
+                profile_file=f"{self.profile_dir}/{self.name}.profile.json",
+                trace_file=f"{self.profile_dir}/{self.name}.trace.json",
+                trace_epochs=self.profile_trace_epochs,
+            )
+        try:
+            self.train_epochs(
+                train_dataset,
+                validation_dataset,
+                num_epochs,
+                patience,
+                start_epoch,
+                checkpoint_writer,
+                profiler,
+            )
+        except BaseException:
+            # The error of training is propagated, a pending error of the writer would replace it
+            writer_error = checkpoint_writer.close(raise_errors=False)
+            if writer_error is not None:
+                self.layout_proxy.print(
+                    f"{text_padding}Writing a checkpoint failed: {writer_error!r}"
+                )
+            raise
+        checkpoint_writer.close()
+        profiler.finish()
+        if profiler.enabled:
+            self.layout_proxy.print(f"{text_padding}{profiler.summary()}")
+        return self
+
+    def train_epochs(
+        self,
+        train_dataset: CM2MLDataset,
+        validation_dataset: CM2MLDataset,
+        num_epochs: int,
+        patience: int,
+        start_epoch: int,
+        checkpoint_writer: CheckpointWriter,
+        profiler: TrainingProfiler,
+    ) -> None:
         train_start_time = time.perf_counter()
         best_loss = float("inf")
+        best_epoch: Optional[int] = None
+        best_state: Optional[dict] = None
         remaining_patience = patience
+        # Gradients are averaged across the ranks by the wrapper, which must not be a submodule
+        train_module = DistributedDataParallel(self) if self.is_distributed else self
         for epoch in range(start_epoch, num_epochs):
+            profiler.start_epoch(epoch)
             self.train()
             epoch_correct_predictions = 0
             epoch_total_prediction_count = 0
             epoch_loss = 0
-            for data in train_dataset:
-                loss, correct_predictions, prediction_count = self.__train(data)
-                epoch_correct_predictions += correct_predictions
-                epoch_total_prediction_count += prediction_count
-                epoch_loss += loss
-            self.save(epoch)
+            epoch_steps = 0
+            # Ranks may have different numbers of steps, the ranks that finish early shadow the others
+            with (
+                train_module.join()
+                if self.is_distributed
+                else contextlib.nullcontext()
+            ):
+                for data in profiler.iterate(
+                    self.iterate(train_dataset, shard=True, shuffle=True)
+                ):
+                    loss, correct_predictions, prediction_count = self.__train(
+                        train_module, data, profiler
+                    )
+                    epoch_correct_predictions += correct_predictions
+                    epoch_total_prediction_count += prediction_count
+                    epoch_loss += loss
+                    epoch_steps += 1
+            if self.is_distributed:
+                (
+                    epoch_loss,
+                    epoch_steps,
+                    epoch_correct_predictions,
+                    epoch_total_prediction_count,
+                ) = all_reduce_sum(
+                    epoch_loss,
+                    epoch_steps,
+                    epoch_correct_predictions,
+                    epoch_total_prediction_count,
+                )
             epoch_accuracy = 0
             if epoch_total_prediction_count > 0:
                 epoch_accuracy = (
                     epoch_correct_predictions / epoch_total_prediction_count
                 )
-            epoch_loss /= len(train_dataset)
+            epoch_loss /= epoch_steps
             if epoch % 5 == 0:
                 self.layout_proxy.print(
-                    f"{text_padding}Epoch: {epoch:03d}, Loss: {epoch_loss:.2f}, Acc: {epoch_accuracy:.2%}, Pred: {epoch_correct_predictions:.0f}/{epoch_total_prediction_count}"
+                    f"{text_padding}Epoch: {epoch:03d}, Loss: {epoch_loss:.2f}, Acc: {epoch_accuracy:.2%}, Pred: {epoch_correct_predictions:.0f}/{epoch_total_prediction_count:.0f}"
                 )
             self.eval()
             with torch.no_grad():
-                validation_loss = 0
-                for data in validation_dataset:
-                    out = self.forward(data)
-                    validation_loss += self.criterion(out, data.y)
+                with profiler.phase("validation"):
+                    validation_loss = 0
+                    for data in self.iterate(validation_dataset, shard=True):
+                        out = self.compute_logits(data)
+                        num_seeds = num_seed_nodes(data)
+                        validation_loss += self.criterion(
+                            out[:num_seeds], data.y[:num_seeds]
+                        )
+                    if self.is_distributed:
+                        # All ranks have to agree on early stopping
+                        (validation_loss,) = all_reduce_sum(validation_loss)
+                if checkpoint_writer.should_save(epoch):
+                    with profiler.phase("checkpoint"):
+                        checkpoint_writer.submit(
+                            epoch, self.checkpoint(), float(validation_loss)
+                        )
                 if validation_loss < best_loss:
                     best_loss = validation_loss
+                    best_epoch = epoch
+                    if self.restore_best_state:
+                        with profiler.phase("checkpoint"):
+                            best_state = copy_state(self.state_dict(), best_state)
                     remaining_patience = patience
                 else:
                     remaining_patience -= 1
@@ -135,20 +389,29 @@ class BaseModel(torch.nn.Module):
                             f"{text_padding}Early stopping in epoch {epoch}"
                         )
                         break
+            profiler.end_epoch()
+        # The epoch that stopped early is not ended in the loop
+        profiler.end_epoch()
         train_end_time = time.perf_counter()
+        if best_state is not None:
+            self.load_state_dict(best_state)
+            self.layout_proxy.print(
+                f"{text_padding}Restored best weights of epoch {best_epoch}"
+            )
         self.layout_proxy.print(
             f"{text_padding}Training time: {pretty_duration(train_end_time - train_start_time)}"
         )
-        return self
+
+    def checkpoint(self) -> dict:
+        return {
+            "name": self.name,
+            "config": self.config,
+            "optimizer": self.optimizer.state_dict(),
+            "model": self.state_dict(),
+        }
 
     def save(self, epoch: int) -> None:
-        torch.save(
-            {
-                "optimizer": self.optimizer.state_dict(),
-                "model": self.state_dict(),
-            },
-            f"{self.checkpoint_file}.{epoch}",
-        )
+        torch.save(self.checkpoint(), f"{self.checkpoint_file}.{epoch}")
 
     def resume(self, epoch: int) -> None:
         checkpoint = torch.load(
@@ -165,27 +428,34 @@ class BaseModel(torch.nn.Module):
         total_top_n_prediction_count = 0
         total_weighted_correct_predictions = 0
         total_weighted_prediction_count = 0
-        preds = []
-        labels = []
-        for data in dataset:
-            out = self.forward(data)
-            preds.extend(out.argmax(dim=1).cpu().numpy())
-            labels.extend(data.y.cpu().numpy())
-            (
-                correct_predictions,
-                prediction_count,
-                top_n_correct_predictions,
-                top_n_prediction_count,
-            ) = top_n_accuracy(out, data.y, dataset.top_n_classes)
-            total_correct_predictions += correct_predictions
-            total_prediction_count += prediction_count
-            total_top_n_correct_predictions += top_n_correct_predictions
-            total_top_n_prediction_count += top_n_prediction_count
-            (weighted_correct_predictions, weighted_prediction_count) = (
-                weighted_accuracy(out, data.y, dataset.class_weights)
-            )
-            total_weighted_correct_predictions += weighted_correct_predictions
-            total_weighted_prediction_count += weighted_prediction_count
+        confusion_matrix = ConfusionMatrix()
+        top_n_classes = torch.tensor(dataset.top_n_classes, device=device)
+        class_weights = torch.tensor(
+            dataset.class_weights, dtype=torch.float64, device=device
+        )
+        with torch.no_grad():
+            for data in self.iterate(dataset):
+                out = self.compute_logits(data)
+                num_seeds = num_seed_nodes(data)
+                out, y = out[:num_seeds], data.y[:num_seeds]
+                confusion_matrix.update(
+                    y.cpu().numpy(), out.argmax(dim=1).cpu().numpy()
+                )
+                (
+                    correct_predictions,
+                    prediction_count,
+                    top_n_correct_predictions,
+                    top_n_prediction_count,
+                ) = top_n_accuracy(out, y, top_n_classes)
+                total_correct_predictions += correct_predictions
+                total_prediction_count += prediction_count
+                total_top_n_correct_predictions += top_n_correct_predictions
+                total_top_n_prediction_count += top_n_prediction_count
+                (weighted_correct_predictions, weighted_prediction_count) = (
+                    weighted_accuracy(out, y, class_weights)
+                )
+                total_weighted_correct_predictions += weighted_correct_predictions
+                total_weighted_prediction_count += weighted_prediction_count
         total_accuracy = 0
         if total_prediction_count > 0:
             total_accuracy = total_correct_predictions / total_prediction_count
@@ -200,9 +470,9 @@ class BaseModel(torch.nn.Module):
                 total_weighted_correct_predictions / total_weighted_prediction_count
             )
         self.layout_proxy.print(
-            f"{text_padding}{dataset.name}: Acc: {total_accuracy:.2%}, Pred: {total_correct_predictions:.0f}/{total_prediction_count}, Acc@{dataset.top_n}: {total_top_n_accuracy:.2%}, Pred@{dataset.top_n}: {total_top_n_correct_predictions:.0f}/{total_top_n_prediction_count}, Wgth: {total_weighted_accuracy:.2%}"
+            f"{text_padding}{dataset.name}: Acc: {total_accuracy:.2%}, Pred: {total_correct_predictions:.0f}/{total_prediction_count}, Acc@{dataset.top_n}: {total_top_n_accuracy:.2%}, Pred@{dataset.top_n}: {total_top_n_correct_predictions:.0f}/{total_top_n_prediction_count:.0f}, Wgth: {total_weighted_accuracy:.2%}"
         )
-        report = classification_report(labels, preds, output_dict=True, zero_division=np.nan)
+        report = confusion_matrix.report()
         return {
             "accuracy": report["accuracy"],
             "weighted avg": report["weighted avg"],
@@ -217,7 +487,7 @@ class BaseModel(torch.nn.Module):
     ):
         self.layout_proxy.print("Evaluating...")
         return {
-            # "train": self.evaluate_dataset(train_dataset),
-            # "validation": self.evaluate_dataset(validation_dataset),
+            "train": self.evaluate_dataset(train_dataset),
+            "validation": self.evaluate_dataset(validation_dataset),
             "test": self.evaluate_dataset(test_dataset),
         }
@@ -16,6 +16,12 @@ class GATModel(BaseModel):
         layout,
     ):
         super(GATModel, self).__init__("GAT", layout=layout)
+        self.config = {
+            "num_node_features": num_node_features,
+            "num_edge_features": num_edge_features,
+            "hidden_channels": hidden_channels,
+            "out_channels": out_channels,
+        }
         embedding_heads = 8
         classification_heads = 8
         self.embed = GATConv(
@@ -35,9 +41,21 @@ class GATModel(BaseModel):
         )
         self.optimizer = torch.optim.Adam(self.parameters(), lr=0.01)
         self.criterion = torch.nn.CrossEntropyLoss()
+        self.precomputed_structure = False
+
+    def use_precomputed_structure(self, enabled: bool = True):
+        # The self-loops are read from the graphs, see CM2MLDataset(precompute_structure=True).
+        # The parameters do not change, so checkpoints are interchangeable with those of the default model.
+        self.precomputed_structure = enabled
+        for conv in [self.embed, self.classifier]:
+            conv.add_self_loops = not enabled
+        return self
 
     def forward(self, data: Data):
-        x, edge_index, edge_attr = data.x, data.edge_index, data.edge_attr
+        if self.precomputed_structure:
+            x, edge_index, edge_attr = data.x, data.gat_edge_index, data.gat_edge_attr
+        else:
+            x, edge_index, edge_attr = data.x, data.edge_index, data.edge_attr
         x = self.embed(x, edge_index, edge_attr=edge_attr)
         h = self.activation(x)
         h = self.dropout(h)
@@ -15,17 +15,39 @@ class GCNModel(BaseModel):
         layout,
     ):
         super(GCNModel, self).__init__("GCN", layout=layout)
+        self.config = {
+            "num_node_features": num_node_features,
+            "hidden_channels": hidden_channels,
+            "out_channels": out_channels,
+        }
         self.embed = GCNConv(num_node_features, hidden_channels)
         self.activation = ReLU()
         self.dropout = Dropout(0.2)
         self.classifier = GCNConv(hidden_channels, out_channels)
         self.optimizer = torch.optim.Adam(self.parameters(), lr=0.01)
         self.criterion = torch.nn.CrossEntropyLoss()
+        self.precomputed_structure = False
+
+    def use_precomputed_structure(self, enabled: bool = True):
+        # The normalized adjacency is read from the graphs, see CM2MLDataset(precompute_structure=True).
+        # The parameters do not change, so checkpoints are interchangeable with those of the default model.
+        self.precomputed_structure = enabled
+        for conv in [self.embed, self.classifier]:
+            conv.normalize = not enabled
+            conv.add_self_loops = not enabled
+        return self
 
     def forward(self, data: Data):
-        x, edge_index = data.x, data.edge_index
-        x = self.embed(x, edge_index)
+        if self.precomputed_structure:
+            x, edge_index, edge_weight = (
+                data.x,
+                data.gcn_edge_index,
+                data.gcn_edge_weight,
+            )
+        else:
+            x, edge_index, edge_weight = data.x, data.edge_index, None
+        x = self.embed(x, edge_index, edge_weight)
         h = self.activation(x)
         h = self.dropout(h)
-        x = self.classifier(h, edge_index)
+        x = self.classifier(h, edge_index, edge_weight)
         return x
@@ -0,0 +1,53 @@
+from typing import Optional
+
+import torch
+from torch.nn import Dropout, Linear, ReLU, Sequential
+from torch_geometric.data import Data
+
+from model.base_model import BaseModel
+from structure import propagate
+
+
+class SGCModel(BaseModel):
+    """
+    Simplified graph convolution, a classifier of node features that were propagated num_hops times
+    over the normalized adjacency. The propagated features are read from the graphs if they were
+    precomputed, see CM2MLDataset(sgc_num_hops=...), so that an epoch only consists of dense matmuls.
+    The classifier is linear, or an MLP with one hidden layer if hidden_channels is given.
+    """
+
+    def __init__(
+        self,
+        num_node_features: int,
+        out_channels: int,
+        num_hops: int,
+        hidden_channels: Optional[int],
+        layout,
+    ):
+        super(SGCModel, self).__init__("SGC", layout=layout)
+        self.config = {
+            "num_node_features": num_node_features,
+            "out_channels": out_channels,
+            "num_hops": num_hops,
+            "hidden_channels": hidden_channels,
+        }
+        self.num_hops = num_hops
+        if hidden_channels is None:
+            self.classifier = Linear(num_node_features, out_channels)
+        else:
+            self.classifier = Sequential(
+                Linear(num_node_features, hidden_channels),
+                ReLU(),
+                Dropout(0.2),
+                Linear(hidden_channels, out_channels),
+            )
+        self.optimizer = torch.optim.Adam(self.parameters(), lr=0.01)
+        self.criterion = torch.nn.CrossEntropyLoss()
+
+    def forward(self, data: Data):
+        if "sgc_x" in data:
+            x = data.sgc_x
+        else:
+            # E.g., graphs for inference, which are not part of a dataset
+            x = propagate(data.x, data.edge_index, self.num_hops)
+        return self.classifier(x)
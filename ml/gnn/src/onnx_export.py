@@ -0,0 +1,173 @@
+import argparse
+import inspect
+from itertools import islice
+import json
+
+import numpy as np
+import onnx
+import torch
+from torch_geometric.data import Data
+
+from dataset_stream import read_items, read_metadata
+from feature_transformer import FeatureTransformer
+from inference import Predictor, load_model
+from model.base_model import BaseModel
+from onnx_inference import (
+    OnnxPredictor,
+    create_session,
+    feature_transformer_key,
+    model_name_key,
+)
+from utils import script_dir
+
+
+class ExportableModel(torch.nn.Module):
+    """
+    Takes the tensors of a graph as inputs, since ONNX models do not have Data objects.
+    """
+
+    def __init__(self, model: BaseModel):
+        super(ExportableModel, self).__init__()
+        self.model = model
+
+    def forward(
+        self, x: torch.Tensor, edge_index: torch.Tensor, edge_attr: torch.Tensor
+    ) -> torch.Tensor:
+        return self.model(Data(x=x, edge_index=edge_index, edge_attr=edge_attr))
+
+
+def export_onnx(
+    model: BaseModel,
+    feature_transformer: FeatureTransformer,
+    output_file: str,
+    opset_version: int = 17,
+) -> None:
+    # The mode of the outermost module decides whether dropout is exported
+    exportable_model = ExportableModel(model.cpu()).eval()
+    # Models without edge features, e.g., GCN, do not use them and the input is removed from the graph
+    num_edge_features = model.config.get("num_edge_features", 0)
+    example_inputs = (
+        torch.zeros(3, model.config["num_node_features"]),
+        torch.tensor([[0, 1], [1, 2]], dtype=torch.long),
+        torch.zeros(2, num_edge_features),
+    )
+    # dynamic_axes belongs to the TorchScript exporter, newer torch versions default to the dynamo exporter
+    exporter_options = (
+        {"dynamo": False}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters
+        else {}
+    )
+    torch.onnx.export(
+        exportable_model,
+        example_inputs,
+        output_file,
+        input_names=["x", "edge_index", "edge_attr"],
+        output_names=["logits"],
+        dynamic_axes={
+            "x": {0: "num_nodes"},
+            "edge_index": {1: "num_edges"},
+            "edge_attr": {0: "num_edges"},
+            "logits": {0: "num_nodes"},
+        },
+        opset_version=opset_version,
+        **exporter_options,
+    )
+    # The feature transformer is stored in the model, so that it can be deployed as a single file
+    onnx_model = onnx.load(output_file)
+    onnx.helper.set_model_props(
+        onnx_model,
+        {
+            model_name_key: model.name,
+            feature_transformer_key: json.dumps(feature_transformer.state_dict()),
+        },
+    )
+    onnx.save(onnx_model, output_file)
+
+
+def check_parity(
+    torch_predictor: Predictor,
+    onnx_predictor: OnnxPredictor,
+    dataset_file: str,
+    max_graphs: int,
+) -> tuple[int, float, float]:
+    """
+    Compares the logits of both backends graph by graph, so that many different numbers of nodes and edges are covered.
+    Returns the number of compared graphs, the maximum absolute difference of the logits,
+    and the fraction of nodes with the same predicted type.
+    """
+    num_graphs = 0
+    max_difference = 0.0
+    num_nodes = 0
+    num_agreements = 0
+    for _, entry in islice(read_items(dataset_file), max_graphs):
+        arrays = torch_predictor.plan.transform_entry(entry)
+        torch_logits = torch_predictor.predict_logits(arrays)
+        onnx_logits = onnx_predictor.predict_logits(arrays)
+        num_graphs += 1
+        if len(torch_logits) == 0:
+            continue
+        max_difference = max(
+            max_difference, float(np.abs(torch_logits - onnx_logits).max())
+        )
+        num_nodes += len(torch_logits)
+        num_agreements += int(
+            np.sum(torch_logits.argmax(axis=1) == onnx_logits.argmax(axis=1))
+        )
+    return num_graphs, max_difference, num_agreements / max(num_nodes, 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Export a trained GNN checkpoint to ONNX for inference with onnxruntime."
+    )
+    parser.add_argument("checkpoint", help="Path to a checkpoint of a trained model")
+    parser.add_argument("output", help="Path to the ONNX file")
+    parser.add_argument(
+        "--feature-transformer",
+        default=f"{script_dir}/../.checkpoints/feature-transformer.json",
+        help="Path to the feature transformer that was fitted during training",
+    )
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument(
+        "--check",
+        help="Path to a dataset file, the exported model is compared to the checkpoint on its graphs",
+    )
+    parser.add_argument(
+        "--check-graphs",
+        type=int,
+        default=1000,
+        help="Maximum number of graphs that are compared",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-4,
+        help="Maximum absolute difference of the logits that passes the check",
+    )
+    args = parser.parse_args()
+
+    model = load_model(args.checkpoint)
+    feature_transformer = FeatureTransformer.load(args.feature_transformer)
+    export_onnx(model, feature_transformer, args.output, opset_version=args.opset)
+    onnx.checker.check_model(args.output)
+    print(f"Exported {model.name} to {args.output}")
+    if args.check is None:
+        return
+
+    metadata = read_metadata(args.check)
+    torch_predictor = Predictor(model, feature_transformer, metadata)
+    onnx_predictor = OnnxPredictor(create_session(args.output), metadata)
+    num_graphs, max_difference, agreement = check_parity(
+        torch_predictor, onnx_predictor, args.check, args.check_graphs
+    )
+    print(
+        f"Compared {num_graphs} graphs, max. absolute difference of the logits: {max_difference:.2e}, same predicted types: {agreement * 100:.2f}%"
+    )
+    if max_difference > args.tolerance:
+        exit(
+            f"The exported model differs from the checkpoint by more than {args.tolerance}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import time
+from typing import Optional
+
+import numpy as np
+import onnxruntime
+
+from base_predictor import BasePredictor, write_predictions
+from dataset_stream import read_items, read_metadata
+from dataset_types import DatasetMetadata
+from feature_fitter import FeatureFitter
+from transform_plan import EntryArrays, TransformPlan
+
+# Keys of the metadata that onnx_export.py stores in the exported models
+model_name_key = "cm2ml.model_name"
+feature_transformer_key = "cm2ml.feature_transformer"
+
+
+def create_session(
+    model_file: str, num_threads: Optional[int] = None
+) -> onnxruntime.InferenceSession:
+    options = onnxruntime.SessionOptions()
+    if num_threads is not None:
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+    return onnxruntime.InferenceSession(
+        model_file, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def compile_plan(
+    feature_transformer_state: dict, metadata: DatasetMetadata
+) -> TransformPlan:
+    """
+    Compiles the transform plan of a fitted feature transformer without importing torch.
+    """
+    node_feature_fitter = FeatureFitter("nodeFeatureVectors")
+    node_feature_fitter.load_state_dict(feature_transformer_state["node_features"])
+    edge_feature_fitter = FeatureFitter("edgeFeatureVectors")
+    edge_feature_fitter.load_state_dict(feature_transformer_state["edge_features"])
+    return TransformPlan(metadata, node_feature_fitter, edge_feature_fitter)
+
+
+class OnnxPredictor(BasePredictor):
+    """
+    Predicts the node types of graphs with a model exported by onnx_export.py on the CPU provider of onnxruntime.
+    The exported model contains the fitted feature transformer, so neither torch nor the training artifacts are required.
+    """
+
+    def __init__(
+        self,
+        session: onnxruntime.InferenceSession,
+        metadata: DatasetMetadata,
+        top_k: int = 3,
+        max_batch_nodes: int = 65536,
+    ):
+        model_metadata = session.get_modelmeta().custom_metadata_map
+        if feature_transformer_key not in model_metadata:
+            raise ValueError(
+                "The ONNX model does not contain a feature transformer, export it with onnx_export.py"
+            )
+        super().__init__(
+            model_metadata[model_name_key],
+            compile_plan(json.loads(model_metadata[feature_transformer_key]), metadata),
+            top_k=top_k,
+            max_batch_nodes=max_batch_nodes,
+        )
+        self.session = session
+        # Models that ignore edge features, e.g., GCN, do not have an input for them
+        self.input_names = [input.name for input in session.get_inputs()]
+
+    @classmethod
+    def load(
+        cls,
+        model_file: str,
+        metadata: DatasetMetadata,
+        top_k: int = 3,
+        max_batch_nodes: int = 65536,
+        num_threads: Optional[int] = None,
+    ) -> "OnnxPredictor":
+        return cls(
+            create_session(model_file, num_threads),
+            metadata,
+            top_k=top_k,
+            max_batch_nodes=max_batch_nodes,
+        )
+
+    def predict_logits(self, arrays: EntryArrays) -> np.ndarray:
+        (logits,) = self.session.run(
+            None, {name: arrays[name] for name in self.input_names}
+        )
+        return logits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Predict the node types of encoded graphs with an exported ONNX model."
+    )
+    parser.add_argument("model", help="Path to a model exported by onnx_export.py")
+    parser.add_argument("input", help="Path to a dataset file with the graphs")
+    parser.add_argument("output", help="Path to the JSONL file for the predictions")
+    parser.add_argument(
+        "--top-k", type=int, default=3, help="Number of most likely types per node"
+    )
+    parser.add_argument(
+        "--batch-nodes",
+        type=int,
+        default=65536,
+        help="Number of nodes that are predicted together",
+    )
+    parser.add_argument("--threads", type=int, help="Number of onnxruntime threads")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    predictor = OnnxPredictor.load(
+        args.model,
+        read_metadata(args.input),
+        top_k=args.top_k,
+        max_batch_nodes=args.batch_nodes,
+        num_threads=args.threads,
+    )
+    num_graphs, num_nodes = write_predictions(
+        predictor.predict(read_items(args.input)), args.output
+    )
+    duration = time.perf_counter() - start_time
+    print(
+        f"Predicted {num_nodes} nodes of {num_graphs} graphs in {duration:.1f}s ({num_nodes / max(duration, 1e-9):.0f} nodes/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
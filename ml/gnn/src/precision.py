@@ -0,0 +1,36 @@
+import torch
+from torch_geometric.data import Data
+
+# Features that are stored with a narrow dtype, the models receive them as float32
+narrowed_keys = ["x", "edge_attr"]
+
+
+def narrow_dtype(tensor: torch.Tensor) -> torch.dtype:
+    """
+    Returns the narrowest dtype that represents the features exactly, i.e., uint8, int8, or int16 for booleans and codes.
+    Tensors with fractional values or integers beyond int16 keep their dtype, since all columns share it.
+    """
+    if tensor.numel() == 0 or not tensor.is_floating_point():
+        return tensor.dtype
+    if not torch.all(tensor == tensor.round()):
+        return tensor.dtype
+    minimum, maximum = tensor.min().item(), tensor.max().item()
+    for dtype in [torch.uint8, torch.int8, torch.int16]:
+        info = torch.iinfo(dtype)
+        if info.min <= minimum and maximum <= info.max:
+            return dtype
+    return tensor.dtype
+
+
+def narrow_features(data: Data) -> Data:
+    for key in narrowed_keys:
+        if key in data:
+            data[key] = data[key].to(narrow_dtype(data[key]))
+    return data
+
+
+def upcast_features(data: Data) -> Data:
+    for key in narrowed_keys:
+        if key in data and data[key].dtype != torch.float32:
+            data[key] = data[key].float()
+    return data
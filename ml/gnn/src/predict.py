@@ -0,0 +1,72 @@
+import argparse
+import time
+
+from base_predictor import write_predictions
+from dataset_stream import read_items, read_metadata
+from inference import Predictor
+from utils import pretty_duration, script_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Predict the node types of encoded graphs with a trained GNN checkpoint."
+    )
+    parser.add_argument("checkpoint", help="Path to a checkpoint of a trained model")
+    parser.add_argument("input", help="Path to a dataset file with the graphs")
+    parser.add_argument("output", help="Path to the JSONL file for the predictions")
+    parser.add_argument(
+        "--feature-transformer",
+        default=f"{script_dir}/../.checkpoints/feature-transformer.json",
+        help="Path to the feature transformer that was fitted during training",
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=3, help="Number of most likely types per node"
+    )
+    parser.add_argument(
+        "--batch-nodes",
+        type=int,
+        default=65536,
+        help="Number of nodes that are predicted together",
+    )
+    parser.add_argument(
+        "--sample-min-nodes",
+        type=int,
+        help="Batches with more nodes are predicted from sampled neighborhoods, which bounds the memory",
+    )
+    parser.add_argument(
+        "--num-neighbors",
+        type=int,
+        nargs="+",
+        default=[10, 10],
+        help="Number of sampled neighbors per layer, -1 for all",
+    )
+    parser.add_argument(
+        "--bf16",
+        action="store_true",
+        help="Predict under bfloat16 autocast on the CPU",
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    predictor = Predictor.load(
+        args.checkpoint,
+        args.feature_transformer,
+        read_metadata(args.input),
+        top_k=args.top_k,
+        max_batch_nodes=args.batch_nodes,
+        num_neighbors=args.num_neighbors,
+        sample_min_nodes=args.sample_min_nodes,
+        bf16_autocast=args.bf16,
+    )
+    # The graphs are streamed from the input and the predictions are written once their batch is done
+    num_graphs, num_nodes = write_predictions(
+        predictor.predict(read_items(args.input)), args.output
+    )
+    duration = time.perf_counter() - start_time
+    print(
+        f"Predicted {num_nodes} nodes of {num_graphs} graphs in {pretty_duration(duration)} ({num_nodes / max(duration, 1e-9):.0f} nodes/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import contextlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import torch
+import torch.profiler
+
+# Phases of an epoch in the order of the summary, the remaining time of an epoch is reported as "other"
+phase_names = [
+    "data",
+    "forward",
+    "loss",
+    "backward",
+    "optimizer",
+    "validation",
+    "checkpoint",
+]
+
+
+class TrainingProfiler:
+    """
+    Records the time spent in each phase of the training epochs and the number of processed graphs, nodes, and edges.
+    Optionally traces the epochs of trace_epochs with torch.profiler, the trace can be viewed with Perfetto or chrome://tracing.
+    A disabled profiler records nothing and adds no measurable overhead.
+    """
+
+    def __init__(
+        self,
+        profile_file: Optional[str] = None,
+        trace_file: Optional[str] = None,
+        trace_epochs: Optional[range] = None,
+    ):
+        self.profile_file = profile_file
+        self.trace_file = trace_file
+        self.trace_epochs = trace_epochs
+        self.enabled = profile_file is not None
+        self.epochs: List[dict] = []
+        self.current: Optional[dict] = None
+        self.epoch_start_time = 0.0
+        self.torch_profiler: Optional[torch.profiler.profile] = None
+
+    def start_epoch(self, epoch: int) -> None:
+        if not self.enabled:
+            return
+        if self.should_trace(epoch) and self.torch_profiler is None:
+            self.torch_profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True
+            )
+            self.torch_profiler.start()
+        self.current = {
+            "epoch": epoch,
+            "phases": {name: 0.0 for name in phase_names},
+            "steps": 0,
+            "graphs": 0,
+            "nodes": 0,
+            "edges": 0,
+        }
+        self.epoch_start_time = time.perf_counter()
+
+    def end_epoch(self) -> None:
+        if self.current is None:
+            return
+        epoch = self.current
+        epoch["duration"] = time.perf_counter() - self.epoch_start_time
+        epoch["phases"]["other"] = max(
+            epoch["duration"] - sum(epoch["phases"].values()), 0.0
+        )
+        # Throughput of the training steps, without validation and checkpoints
+        train_duration = sum(
+            epoch["phases"][name]
+            for name in ["data", "forward", "loss", "backward", "optimizer"]
+        )
+        for counter in ["graphs", "nodes", "edges"]:
+            epoch[f"{counter}_per_second"] = epoch[counter] / max(train_duration, 1e-9)
+        self.epochs.append(epoch)
+        self.current = None
+        if self.torch_profiler is not None and not self.should_trace(
+            epoch["epoch"] + 1
+        ):
+            self.stop_trace()
+
+    def should_trace(self, epoch: int) -> bool:
+        return (
+            self.trace_epochs is not None
+            and self.trace_file is not None
+            and epoch in self.trace_epochs
+        )
+
+    def stop_trace(self) -> None:
+        self.torch_profiler.stop()
+        os.makedirs(os.path.dirname(self.trace_file), exist_ok=True)
+        self.torch_profiler.export_chrome_trace(self.trace_file)
+        self.torch_profiler = None
+
+    def phase(self, name: str):
+        if self.current is None:
+            return contextlib.nullcontext()
+        return self.record_phase(name)
+
+    @contextlib.contextmanager
+    def record_phase(self, name: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            if self.torch_profiler is not None:
+                # Labels the phases in the trace
+                with torch.profiler.record_function(name):
+                    yield
+            else:
+                yield
+        finally:
+            self.current["phases"][name] += time.perf_counter() - start_time
+
+    def iterate(self, iterable: Iterable) -> Iterator:
+        """
+        Yields the items of iterable and records the time to produce them, e.g., to collate mini-batches, as data phase.
+        """
+        if self.current is None:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.record_phase("data"):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, data) -> None:
+        if self.current is None:
+            return
+        self.current["steps"] += 1
+        if "num_seed_nodes" in data:
+            # Sampled subgraphs count their seeds and their share of the sampled graph,
+            # the neighborhoods of the seeds would inflate the throughput compared to full-batch training
+            share = data.num_seed_nodes / max(data.source_num_nodes, 1)
+            self.current["graphs"] += share
+            self.current["nodes"] += data.num_seed_nodes
+            self.current["edges"] += share * data.source_num_edges
+            return
+        # Mini-batches know their number of graphs, single graphs do not
+        self.current["graphs"] += getattr(data, "num_graphs", 1)
+        self.current["nodes"] += data.num_nodes
+        self.current["edges"] += data.num_edges
+
+    def finish(self) -> None:
+        """
+        Stops a running trace, e.g., after early stopping, and writes the profile.
+        """
+        self.end_epoch()
+        if self.torch_profiler is not None:
+            self.stop_trace()
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(self.profile_file), exist_ok=True)
+        with open(self.profile_file, "w") as file:
+            json.dump({"total": self.total(), "epochs": self.epochs}, file, indent=4)
+
+    def total(self) -> dict:
+        phases: Dict[str, float] = {}
+        for epoch in self.epochs:
+            for name, duration in epoch["phases"].items():
+                phases[name] = phases.get(name, 0.0) + duration
+        return {
+            "epochs": len(self.epochs),
+            "duration": sum(epoch["duration"] for epoch in self.epochs),
+            "phases": phases,
+            **{
+                counter: sum(epoch[counter] for epoch in self.epochs)
+                for counter in ["steps", "graphs", "nodes", "edges"]
+            },
+        }
+
+    def summary(self) -> str:
+        total = self.total()
+        duration = max(total["duration"], 1e-9)
+        shares = ", ".join(
+            f"{name} {phase_duration / duration:.0%}"
+            for name, phase_duration in total["phases"].items()
+        )
+        return f"Profile: {shares}"
@@ -0,0 +1,125 @@
+from typing import Iterator, List
+
+import torch
+from torch_geometric.data import Data
+
+from structure import precompute_structure
+
+
+class NeighborSampler:
+    """
+    Splits a graph into subgraphs of at most batch_nodes seed nodes and their sampled neighborhoods.
+    num_neighbors is the fan-out per layer, i.e., the number of incoming edges that are sampled for each node
+    of the previous hop, starting with the seeds. -1 keeps all incoming edges.
+    The seeds are the first num_seed_nodes nodes of a subgraph, the other nodes only provide their messages.
+    The size of a subgraph is bounded by the seeds and the fan-out, regardless of the size of the graph.
+    """
+
+    def __init__(self, num_neighbors: List[int], batch_nodes: int = 1024):
+        self.num_neighbors = num_neighbors
+        self.batch_nodes = batch_nodes
+
+    def sample(self, data: Data, shuffle: bool = False) -> Iterator[Data]:
+        """
+        Yields subgraphs whose seeds cover every node of the graph once, in node order unless shuffled.
+        """
+        num_nodes = data.num_nodes
+        device = data.edge_index.device
+        # The incoming edges of node i are edge_order[row_pointers[i] : row_pointers[i + 1]]
+        targets = data.edge_index[1]
+        edge_order = torch.argsort(targets, stable=True)
+        row_pointers = torch.zeros(num_nodes + 1, dtype=torch.long, device=device)
+        row_pointers[1:] = torch.cumsum(torch.bincount(targets, minlength=num_nodes), 0)
+        # Maps the nodes of the graph to those of the current subgraph, -1 if not sampled
+        local_index = torch.full((num_nodes,), -1, dtype=torch.long, device=device)
+        if shuffle:
+            seed_order = torch.randperm(num_nodes, device=device)
+        else:
+            seed_order = torch.arange(num_nodes, device=device)
+        for seeds in seed_order.split(self.batch_nodes):
+            yield self.sample_subgraph(
+                data, seeds, edge_order, row_pointers, local_index
+            )
+
+    def sample_subgraph(
+        self,
+        data: Data,
+        seeds: torch.Tensor,
+        edge_order: torch.Tensor,
+        row_pointers: torch.Tensor,
+        local_index: torch.Tensor,
+    ) -> Data:
+        device = seeds.device
+        local_index[seeds] = torch.arange(len(seeds), device=device)
+        node_ids = [seeds]
+        edge_ids = []
+        num_sampled_nodes = len(seeds)
+        frontier = seeds
+        for fan_out in self.num_neighbors:
+            sampled_edges = sample_edges(frontier, fan_out, edge_order, row_pointers)
+            edge_ids.append(sampled_edges)
+            sources = data.edge_index[0, sampled_edges]
+            # Nodes of earlier hops are not sampled again, so every edge is sampled at most once
+            frontier = torch.unique(sources[local_index[sources] < 0])
+            local_index[frontier] = torch.arange(
+                num_sampled_nodes, num_sampled_nodes + len(frontier), device=device
+            )
+            num_sampled_nodes += len(frontier)
+            node_ids.append(frontier)
+        node_ids = torch.cat(node_ids)
+        edge_ids = torch.cat(edge_ids) if len(edge_ids) > 0 else edge_order[:0]
+        edge_index = local_index[data.edge_index[:, edge_ids]]
+        # Reset for the next subgraph, which is cheaper than allocating a new mapping
+        local_index[node_ids] = -1
+
+        subgraph = Data(x=data.x[node_ids], edge_index=edge_index)
+        subgraph.num_seed_nodes = len(seeds)
+        # Size of the sampled graph, e.g., to report the throughput in terms of whole graphs
+        subgraph.source_num_nodes = data.num_nodes
+        subgraph.source_num_edges = data.num_edges
+        if "edge_attr" in data:
+            subgraph.edge_attr = data.edge_attr[edge_ids]
+        if "y" in data:
+            subgraph.y = data.y[node_ids]
+        if "sgc_x" in data:
+            subgraph.sgc_x = data.sgc_x[node_ids]
+        if "gcn_edge_index" in data:
+            # The structure of the whole graph does not apply to the subgraph
+            subgraph = precompute_structure(subgraph)
+        return subgraph
+
+
+def sample_edges(
+    nodes: torch.Tensor,
+    fan_out: int,
+    edge_order: torch.Tensor,
+    row_pointers: torch.Tensor,
+) -> torch.Tensor:
+    """
+    Returns the ids of up to fan_out incoming edges of each node.
+    """
+    starts = row_pointers[nodes]
+    degrees = row_pointers[nodes + 1] - starts
+    keep_all = degrees <= fan_out if fan_out >= 0 else torch.ones_like(degrees).bool()
+    # All incoming edges of nodes with a degree up to the fan-out
+    counts = degrees[keep_all]
+    segment_offsets = torch.cumsum(counts, 0) - counts - starts[keep_all]
+    all_positions = torch.arange(
+        int(counts.sum()), device=nodes.device
+    ) - torch.repeat_interleave(segment_offsets, counts)
+    # Random incoming edges of the other nodes, drawn with replacement so that the cost does not depend on their degree
+    sampled_positions = starts[~keep_all].unsqueeze(1) + (
+        torch.rand(int((~keep_all).sum()), max(fan_out, 0), device=nodes.device)
+        * degrees[~keep_all].unsqueeze(1)
+    ).long()
+    positions = torch.cat([all_positions, torch.unique(sampled_positions.flatten())])
+    return edge_order[positions]
+
+
+def num_seed_nodes(data: Data) -> int:
+    """
+    Returns the number of nodes whose outputs count, i.e., the seeds of sampled subgraphs and all nodes of other graphs.
+    """
+    if "num_seed_nodes" in data:
+        return data.num_seed_nodes
+    return data.num_nodes
@@ -0,0 +1,394 @@
+import argparse
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gc
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import torch
+
+from base_predictor import BasePredictor, GraphPrediction, InvalidGraphError
+from dataset_stream import read_metadata
+from dataset_types import DatasetDataEntry
+from feature_transformer import FeatureTransformer
+from inference import Predictor, load_model
+from utils import script_dir
+
+
+class LatencyStats:
+    """
+    Keeps the latencies of the most recent requests and the sizes of the forward passes.
+    """
+
+    def __init__(self, window: int = 10000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.num_requests = 0
+        self.num_errors = 0
+        self.num_batches = 0
+        self.num_batched_requests = 0
+
+    def add_request(self, latency: float, error: bool = False) -> None:
+        with self.lock:
+            self.latencies.append(latency)
+            self.num_requests += 1
+            if error:
+                self.num_errors += 1
+
+    def add_batch(self, num_requests: int) -> None:
+        with self.lock:
+            self.num_batches += 1
+            self.num_batched_requests += num_requests
+
+    def report(self) -> dict:
+        with self.lock:
+            latencies = np.array(self.latencies, dtype=np.float64) * 1000
+            report = {
+                "requests": self.num_requests,
+                "errors": self.num_errors,
+                "batches": self.num_batches,
+                "mean_requests_per_batch": self.num_batched_requests
+                / max(self.num_batches, 1),
+            }
+        if len(latencies) > 0:
+            for percentile in [50, 90, 99]:
+                report[f"p{percentile}_ms"] = float(np.percentile(latencies, percentile))
+            report["max_ms"] = float(latencies.max())
+        return report
+
+
+class MicroBatcher:
+    """
+    Collects the graphs of concurrent requests and predicts them with a single forward pass.
+    A batch is closed once no request arrived for max_wait_ms or it has max_batch_nodes nodes.
+    """
+
+    def __init__(
+        self,
+        predictor: BasePredictor,
+        stats: LatencyStats,
+        max_wait_ms: float = 2,
+        max_batch_nodes: int = 8192,
+    ):
+        self.predictor = predictor
+        self.stats = stats
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_nodes = max_batch_nodes
+        self.requests: queue.Queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(
+        self, items: List[Tuple[str, DatasetDataEntry]]
+    ) -> "Future[List[GraphPrediction]]":
+        future: Future = Future()
+        self.requests.put((items, future))
+        return future
+
+    def run(self) -> None:
+        while True:
+            batch: List[Tuple[List[Tuple[str, DatasetDataEntry]], Future]] = []
+            batch_nodes = self.add_request(batch, self.requests.get())
+            while batch_nodes < self.max_batch_nodes:
+                try:
+                    request = self.requests.get(timeout=self.max_wait)
+                except queue.Empty:
+                    break
+                batch_nodes += self.add_request(batch, request)
+            try:
+                self.predict(batch)
+            except Exception as error:
+                # The thread serves all later requests of the model, so it must never stop
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    def add_request(
+        self,
+        batch: List[Tuple[List[Tuple[str, DatasetDataEntry]], Future]],
+        request: Tuple[List[Tuple[str, DatasetDataEntry]], Future],
+    ) -> int:
+        items, future = request
+        try:
+            num_nodes = count_nodes(items)
+        except Exception as error:
+            # Malformed requests fail on their own instead of stopping the batcher
+            future.set_exception(error)
+            return 0
+        batch.append(request)
+        return num_nodes
+
+    def predict(
+        self, batch: List[Tuple[List[Tuple[str, DatasetDataEntry]], Future]]
+    ) -> None:
+        if len(batch) == 0:
+            return
+        items = [item for request_items, _ in batch for item in request_items]
+        try:
+            predictions = self.predictor.predict_batch(items)
+        except Exception:
+            # A single malformed graph must not fail the other requests of the batch
+            for request_items, future in batch:
+                self.predict_single(request_items, future)
+            return
+        self.stats.add_batch(len(batch))
+        offset = 0
+        for request_items, future in batch:
+            future.set_result(predictions[offset : offset + len(request_items)])
+            offset += len(request_items)
+
+    def predict_single(
+        self, items: List[Tuple[str, DatasetDataEntry]], future: Future
+    ) -> None:
+        try:
+            future.set_result(self.predictor.predict_batch(items))
+            self.stats.add_batch(1)
+        except Exception as error:
+            future.set_exception(error)
+
+
+def count_nodes(items: List[Tuple[str, DatasetDataEntry]]) -> int:
+    return sum(len(entry["nodes"]) for _, entry in items)
+
+
+def validate_items(items: List[Tuple[str, DatasetDataEntry]]) -> None:
+    for key, entry in items:
+        if not isinstance(entry, dict) or not isinstance(entry.get("nodes"), list):
+            raise ValueError(f"Graph {key} does not have a list of nodes")
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict?model=GAT with a body like {"data": {"<graph id>": <entry>}}, as in the dataset files,
+    responds with {"predictions": [...]} in the format of predict.py.
+    GET /stats responds with the latency percentiles of the recent requests.
+    """
+
+    server: "PredictionServer"
+    protocol_version = "HTTP/1.1"
+    # Otherwise the separately written headers and body wait for a delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self.send_json(
+                200,
+                {
+                    "models": list(self.server.batchers.keys()),
+                    **self.server.stats.report(),
+                },
+            )
+        elif path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self) -> None:
+        start_time = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+            return
+        try:
+            batcher = self.get_batcher(url.query)
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"] or 0)))
+            items = list(body["data"].items())
+            validate_items(items)
+        except (KeyError, TypeError, AttributeError, ValueError) as error:
+            self.server.stats.add_request(time.perf_counter() - start_time, error=True)
+            self.send_json(400, {"error": f"Invalid request: {error!r}"})
+            return
+        try:
+            predictions = batcher.submit(items).result() if len(items) > 0 else []
+        except InvalidGraphError as error:
+            self.server.stats.add_request(time.perf_counter() - start_time, error=True)
+            self.send_json(400, {"error": f"Invalid request: {error!r}"})
+            return
+        except Exception as error:
+            # Failures of the model are not caused by the client
+            self.server.stats.add_request(time.perf_counter() - start_time, error=True)
+            self.send_json(500, {"error": f"Prediction failed: {error!r}"})
+            return
+        self.server.stats.add_request(time.perf_counter() - start_time)
+        self.send_json(200, {"predictions": predictions})
+
+    def get_batcher(self, query: str) -> MicroBatcher:
+        model_names = parse_qs(query).get("model")
+        if model_names is None:
+            return next(iter(self.server.batchers.values()))
+        return self.server.batchers[model_names[0]]
+
+    def send_json(self, status: int, body: dict) -> None:
+        response = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def address_string(self) -> str:
+        # Clients of Unix sockets have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UnixPredictionHandler(PredictionHandler):
+    disable_nagle_algorithm = False
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        batchers: Dict[str, MicroBatcher],
+        stats: LatencyStats,
+        verbose: bool = False,
+    ):
+        self.batchers = batchers
+        self.stats = stats
+        self.verbose = verbose
+        super().__init__(address, PredictionHandler)
+
+
+class UnixPredictionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        batchers: Dict[str, MicroBatcher],
+        stats: LatencyStats,
+        verbose: bool = False,
+    ):
+        self.batchers = batchers
+        self.stats = stats
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, UnixPredictionHandler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve node type predictions of trained GNN checkpoints over HTTP."
+    )
+    parser.add_argument(
+        "checkpoints",
+        nargs="+",
+        help="Paths to checkpoints of trained models or models exported to ONNX, the first one is the default model",
+    )
+    parser.add_argument(
+        "--metadata",
+        required=True,
+        help="Path to a dataset file with the metadata of the graphs, e.g., the training dataset",
+    )
+    parser.add_argument(
+        "--feature-transformer",
+        default=f"{script_dir}/../.checkpoints/feature-transformer.json",
+        help="Path to the feature transformer that was fitted during training",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--unix-socket", help="Path to a Unix socket that is used instead of TCP"
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=3, help="Number of most likely types per node"
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=2,
+        help="Time that a batch waits for further requests",
+    )
+    parser.add_argument(
+        "--batch-nodes",
+        type=int,
+        default=8192,
+        help="Number of nodes after which a batch is predicted without waiting",
+    )
+    parser.add_argument("--threads", type=int, help="Number of torch threads")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    metadata = read_metadata(args.metadata)
+    feature_transformer: Optional[FeatureTransformer] = None
+    stats = LatencyStats()
+    batchers: Dict[str, MicroBatcher] = {}
+    for checkpoint_file in args.checkpoints:
+        predictor: BasePredictor
+        if checkpoint_file.endswith(".onnx"):
+            # Imported lazily, so that serving checkpoints does not require onnxruntime
+            from onnx_inference import OnnxPredictor
+
+            # Exported models contain their feature transformer
+            predictor = OnnxPredictor.load(
+                checkpoint_file,
+                metadata,
+                top_k=args.top_k,
+                max_batch_nodes=args.batch_nodes,
+                num_threads=args.threads,
+            )
+        else:
+            if feature_transformer is None:
+                feature_transformer = FeatureTransformer.load(args.feature_transformer)
+            predictor = Predictor(
+                load_model(checkpoint_file),
+                feature_transformer,
+                metadata,
+                top_k=args.top_k,
+                max_batch_nodes=args.batch_nodes,
+            )
+        if predictor.name in batchers:
+            # Requests select the model by its name, so one of them would be unreachable
+            parser.error(
+                f"Multiple checkpoints contain a {predictor.name} model, serve them separately"
+            )
+        batchers[predictor.name] = MicroBatcher(
+            predictor,
+            stats,
+            max_wait_ms=args.max_wait_ms,
+            max_batch_nodes=args.batch_nodes,
+        )
+
+    # The objects of torch and the models live as long as the server, full collections would scan them for every few requests
+    gc.freeze()
+    server: Optional[socketserver.BaseServer] = None
+    if args.unix_socket is not None:
+        server = UnixPredictionServer(
+            args.unix_socket, batchers, stats, verbose=args.verbose
+        )
+        print(f"Serving {', '.join(batchers)} on {args.unix_socket}")
+    else:
+        server = PredictionServer(
+            (args.host, args.port), batchers, stats, verbose=args.verbose
+        )
+        print(f"Serving {', '.join(batchers)} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket is not None and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from torch import Tensor
+from torch_geometric.data import Data
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+from torch_geometric.utils import add_self_loops, remove_self_loops, scatter
+
+
+def precompute_structure(data: Data) -> Data:
+    """
+    Adds the graph structure that GCNConv and GATConv would otherwise compute in every forward pass.
+    gcn_edge_index and gcn_edge_weight are the symmetrically normalized adjacency with self-loops,
+    gat_edge_index and gat_edge_attr have a self-loop per node whose attributes are the mean of the incoming edges.
+    The attribute names contain "index", so that they are offset like edge_index when graphs are collated.
+    """
+    num_nodes = data.num_nodes
+    data.gcn_edge_index, data.gcn_edge_weight = gcn_norm(
+        data.edge_index,
+        None,
+        num_nodes,
+        improved=False,
+        add_self_loops=True,
+        dtype=data.x.dtype,
+    )
+    gat_edge_index, gat_edge_attr = remove_self_loops(data.edge_index, data.edge_attr)
+    data.gat_edge_index, data.gat_edge_attr = add_self_loops(
+        gat_edge_index, gat_edge_attr, fill_value="mean", num_nodes=num_nodes
+    )
+    return data
+
+
+def propagate_features(data: Data, num_hops: int) -> Data:
+    """
+    Adds sgc_x, the node features propagated num_hops times over the normalized adjacency, for SGC models.
+    """
+    data.sgc_x = propagate(data.x, data.edge_index, num_hops)
+    return data
+
+
+def propagate(x: Tensor, edge_index: Tensor, num_hops: int) -> Tensor:
+    # Like SGConv, with the same normalized adjacency with self-loops as GCNConv
+    edge_index, edge_weight = gcn_norm(
+        edge_index, None, x.size(0), improved=False, add_self_loops=True, dtype=x.dtype
+    )
+    source, target = edge_index
+    for _ in range(num_hops):
+        x = scatter(
+            x[source] * edge_weight.unsqueeze(-1),
+            target,
+            dim=0,
+            dim_size=x.size(0),
+            reduce="sum",
+        )
+    return x
@@ -0,0 +1,285 @@
+import io
+import queue
+import random
+import socket
+import threading
+from typing import Dict, Optional
+
+import torch
+import torch.distributed
+import torch.multiprocessing
+
+from dataset import CM2MLDataset
+from layout_proxy import ForwardingLayoutProxy, LayoutProxy
+from model.base_model import BaseModel
+
+
+def fit_and_evaluate(
+    model: BaseModel,
+    seed: str,
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+    num_epochs: int,
+    start_epoch: int,
+    patience: int,
+) -> dict:
+    # Reseeded for every model, so that the results do not depend on the models trained before it
+    torch.manual_seed(seed)
+    random.seed(seed)
+    model.fit(
+        train_dataset=train_dataset,
+        validation_dataset=validation_dataset,
+        num_epochs=num_epochs,
+        start_epoch=start_epoch,
+        patience=patience,
+    )
+    return model.evaluate(
+        train_dataset=train_dataset,
+        validation_dataset=validation_dataset,
+        test_dataset=test_dataset,
+    )
+
+
+def fit_and_evaluate_in_parallel(
+    models: Dict[str, BaseModel],
+    seed: str,
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+    num_epochs: int,
+    start_epoch: int,
+    patience: int,
+    num_threads_per_model: Optional[int] = None,
+) -> Dict[str, dict]:
+    """
+    Trains every model in a worker process of its own, with the datasets in shared memory.
+    Lines printed by the workers are forwarded to the layouts of the models, and the trained weights
+    are loaded into the models of this process.
+    """
+    if num_threads_per_model is None:
+        num_threads_per_model = max(1, torch.get_num_threads() // len(models))
+    for dataset in [train_dataset, validation_dataset, test_dataset]:
+        dataset.share_memory()
+    # Spawned workers behave the same on all platforms and do not inherit the threads of this process
+    context = torch.multiprocessing.get_context("spawn")
+    log_queue = context.Queue()
+    result_queue = context.Queue()
+    processes = {
+        key: context.Process(
+            target=fit_and_evaluate_worker,
+            args=(
+                key,
+                model,
+                seed,
+                train_dataset,
+                validation_dataset,
+                test_dataset,
+                num_epochs,
+                start_epoch,
+                patience,
+                num_threads_per_model,
+                log_queue,
+                result_queue,
+            ),
+            name=f"train-{key}",
+        )
+        for key, model in models.items()
+    }
+    return run_workers(models, processes, log_queue, result_queue, len(models))
+
+
+def fit_and_evaluate_distributed(
+    models: Dict[str, BaseModel],
+    seed: str,
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+    num_epochs: int,
+    start_epoch: int,
+    patience: int,
+    world_size: int,
+    num_threads_per_rank: Optional[int] = None,
+) -> Dict[str, dict]:
+    """
+    Trains the models one after another, each with world_size data-parallel ranks that communicate
+    over gloo. Every rank trains on a shard of the graphs and the first rank evaluates the model.
+    """
+    if num_threads_per_rank is None:
+        num_threads_per_rank = max(1, torch.get_num_threads() // world_size)
+    for dataset in [train_dataset, validation_dataset, test_dataset]:
+        dataset.share_memory()
+    context = torch.multiprocessing.get_context("spawn")
+    reports = {}
+    for key, model in models.items():
+        log_queue = context.Queue()
+        result_queue = context.Queue()
+        init_method = f"tcp://127.0.0.1:{find_free_port()}"
+        processes = {
+            f"{key}-{rank}": context.Process(
+                target=fit_and_evaluate_distributed_worker,
+                args=(
+                    rank,
+                    world_size,
+                    init_method,
+                    key,
+                    model,
+                    seed,
+                    train_dataset,
+                    validation_dataset,
+                    test_dataset,
+                    num_epochs,
+                    start_epoch,
+                    patience,
+                    num_threads_per_rank,
+                    log_queue,
+                    result_queue,
+                ),
+                name=f"train-{key}-{rank}",
+            )
+            for rank in range(world_size)
+        }
+        reports.update(
+            run_workers({key: model}, processes, log_queue, result_queue, 1)
+        )
+    return reports
+
+
+def run_workers(
+    models: Dict[str, BaseModel],
+    processes: Dict[str, torch.multiprocessing.Process],
+    log_queue,
+    result_queue,
+    num_results: int,
+) -> Dict[str, dict]:
+    log_thread = threading.Thread(target=forward_logs, args=(models, log_queue))
+    log_thread.start()
+    try:
+        for process in processes.values():
+            process.start()
+        reports = {}
+        while len(reports) < num_results:
+            try:
+                key, state, report = result_queue.get(timeout=1)
+            except queue.Empty:
+                for name, process in processes.items():
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError(
+                            f"Worker {name} failed with exit code {process.exitcode}"
+                        )
+                continue
+            models[key].load_state_dict(
+                torch.load(io.BytesIO(state), weights_only=True)
+            )
+            reports[key] = report
+        for process in processes.values():
+            process.join()
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        log_queue.put(None)
+        log_thread.join()
+    return reports
+
+
+def fit_and_evaluate_worker(
+    key: str,
+    model: BaseModel,
+    seed: str,
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+    num_epochs: int,
+    start_epoch: int,
+    patience: int,
+    num_threads: int,
+    log_queue,
+    result_queue,
+) -> None:
+    torch.set_num_threads(num_threads)
+    model.layout_proxy = ForwardingLayoutProxy(model.layout_proxy, log_queue, key)
+    report = fit_and_evaluate(
+        model,
+        seed,
+        train_dataset,
+        validation_dataset,
+        test_dataset,
+        num_epochs,
+        start_epoch,
+        patience,
+    )
+    put_result(result_queue, key, model, report)
+
+
+def fit_and_evaluate_distributed_worker(
+    rank: int,
+    world_size: int,
+    init_method: str,
+    key: str,
+    model: BaseModel,
+    seed: str,
+    train_dataset: CM2MLDataset,
+    validation_dataset: CM2MLDataset,
+    test_dataset: CM2MLDataset,
+    num_epochs: int,
+    start_epoch: int,
+    patience: int,
+    num_threads: int,
+    log_queue,
+    result_queue,
+) -> None:
+    torch.set_num_threads(num_threads)
+    torch.distributed.init_process_group(
+        "gloo", init_method=init_method, rank=rank, world_size=world_size
+    )
+    try:
+        model.use_distributed(rank, world_size)
+        # Only the first rank logs, the other ranks would print the same lines
+        if rank == 0:
+            model.layout_proxy = ForwardingLayoutProxy(
+                model.layout_proxy, log_queue, key
+            )
+        else:
+            model.layout_proxy = LayoutProxy(None, model.layout_proxy.title)
+        torch.manual_seed(seed)
+        random.seed(seed)
+        model.fit(
+            train_dataset=train_dataset,
+            validation_dataset=validation_dataset,
+            num_epochs=num_epochs,
+            start_epoch=start_epoch,
+            patience=patience,
+        )
+    finally:
+        torch.distributed.destroy_process_group()
+    if rank == 0:
+        # The weights are the same on all ranks, so the first rank evaluates them on its own
+        report = model.evaluate(
+            train_dataset=train_dataset,
+            validation_dataset=validation_dataset,
+            test_dataset=test_dataset,
+        )
+        put_result(result_queue, key, model, report)
+
+
+def put_result(result_queue, key: str, model: BaseModel, report: dict) -> None:
+    # Serialized, so that the weights do not depend on the worker being alive when they are received
+    state = io.BytesIO()
+    torch.save(model.state_dict(), state)
+    result_queue.put((key, state.getvalue(), report))
+
+
+def forward_logs(models: Dict[str, BaseModel], log_queue) -> None:
+    while True:
+        message = log_queue.get()
+        if message is None:
+            return
+        key, string = message
+        models[key].layout_proxy.print(string)
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
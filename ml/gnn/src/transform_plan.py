@@ -0,0 +1,227 @@
+from typing import Callable, List, Optional, Sequence, Tuple, TypedDict
+
+import numpy as np
+
+from category_encoder import CategoryEncoder
+from dataset_types import (
+    DatasetDataEntry,
+    DatasetMetadata,
+    FeatureMetadata,
+    FeatureType,
+    RawFeatureVector,
+)
+from feature_fitter import FeatureFitter
+
+ColumnConverter = Callable[[Sequence[Optional[str]]], np.ndarray]
+
+
+class EntryArrays(TypedDict):
+    x: np.ndarray
+    y: np.ndarray
+    edge_index: np.ndarray
+    edge_attr: np.ndarray
+
+
+class FeaturePlan:
+    """
+    Transforms feature vectors column by column, with one converter per column that is
+    specialized to the type of the feature.
+    """
+
+    def __init__(self, feature_metadata: FeatureMetadata, fitter: FeatureFitter):
+        self.num_columns = len(feature_metadata)
+        self.is_fully_encoded = all(
+            feature_type.startswith("encoded-") for _, feature_type, _ in feature_metadata
+        )
+        self.converters: List[ColumnConverter] = [
+            compile_converter(feature_type, feature_name, fitter, feature_index)
+            for feature_index, (feature_name, feature_type, _) in enumerate(
+                feature_metadata
+            )
+        ]
+
+    def transform(self, feature_vectors: List[RawFeatureVector]) -> np.ndarray:
+        self.check_lengths(feature_vectors)
+        if self.is_fully_encoded:
+            # Pre-encoded features are converted with a single call, without visiting columns
+            return np.array(feature_vectors, dtype=np.float32).reshape(
+                len(feature_vectors), self.num_columns
+            )
+        matrix = np.zeros((len(feature_vectors), self.num_columns), dtype=np.float32)
+        if len(feature_vectors) == 0:
+            return matrix
+        for column_index, column in enumerate(zip(*feature_vectors)):
+            matrix[:, column_index] = self.converters[column_index](column)
+        return matrix
+
+    def check_lengths(self, feature_vectors: List[RawFeatureVector]) -> None:
+        # Columns are converted with zip, which would silently stop at the shortest vector
+        for index, feature_vector in enumerate(feature_vectors):
+            if len(feature_vector) != self.num_columns:
+                raise ValueError(
+                    f"Feature vector {index} has {len(feature_vector)} features, but {self.num_columns} are expected"
+                )
+
+
+class TransformPlan:
+    def __init__(
+        self,
+        metadata: DatasetMetadata,
+        node_feature_fitter: FeatureFitter,
+        edge_feature_fitter: FeatureFitter,
+    ):
+        self.node_plan = FeaturePlan(metadata["nodeFeatures"], node_feature_fitter)
+        self.edge_plan = FeaturePlan(metadata["edgeFeatures"], edge_feature_fitter)
+        self.type_indices = get_type_indices(metadata)
+        self.label_names = create_prediction_label_names(metadata, node_feature_fitter)
+
+    def transform_entry(self, entry: DatasetDataEntry) -> EntryArrays:
+        x = self.node_plan.transform(entry["nodeFeatureVectors"])
+        y = split_types(x, self.type_indices)
+        edge_attr = self.edge_plan.transform(entry["edgeFeatureVectors"])
+        edge_index = np.ascontiguousarray(
+            np.asarray(entry["list"], dtype=np.int64).reshape(-1, 2).T
+        )
+        if edge_index.size > 0 and (
+            edge_index.min() < 0 or edge_index.max() >= len(x)
+        ):
+            raise ValueError(f"The edges reference nodes outside of the {len(x)} nodes")
+        return {"x": x, "y": y, "edge_index": edge_index, "edge_attr": edge_attr}
+
+
+def collate_arrays(entries: List[EntryArrays]) -> Tuple[EntryArrays, np.ndarray]:
+    """
+    Combines the arrays of multiple graphs into the arrays of their disjoint union.
+    Also returns the offsets of the nodes of each graph, with the total number of nodes as last offset.
+    """
+    node_counts = np.array([len(entry["x"]) for entry in entries], dtype=np.int64)
+    node_offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+    np.cumsum(node_counts, out=node_offsets[1:])
+    edge_index = np.concatenate(
+        [
+            entry["edge_index"] + node_offset
+            for entry, node_offset in zip(entries, node_offsets)
+        ],
+        axis=1,
+    )
+    collated: EntryArrays = {
+        "x": np.concatenate([entry["x"] for entry in entries]),
+        "y": np.concatenate([entry["y"] for entry in entries]),
+        "edge_index": edge_index,
+        "edge_attr": np.concatenate([entry["edge_attr"] for entry in entries]),
+    }
+    return collated, node_offsets
+
+
+def compile_converter(
+    feature_type: FeatureType,
+    feature_name: str,
+    fitter: FeatureFitter,
+    feature_index: int,
+) -> ColumnConverter:
+    if feature_type.startswith("encoded-"):
+        return convert_encoded_column
+    # String features are encoded as categories, too
+    if feature_type == "category" or feature_type == "string":
+        return compile_category_converter(fitter.get_encoder(feature_index))
+    elif feature_type == "boolean":
+        return convert_boolean_column
+    elif feature_type == "integer" or feature_type == "float":
+        return convert_numeric_column
+    else:
+        raise ValueError(f"Unknown type '{feature_type}' for feature '{feature_name}'")
+
+
+def compile_category_converter(encoder: CategoryEncoder) -> ColumnConverter:
+    codes = {None: 0, **encoder.codes}
+    unknown_code = encoder.unknown_code
+
+    def convert_category_column(column: Sequence[Optional[str]]) -> np.ndarray:
+        return np.array(
+            [codes.get(value, unknown_code) for value in column], dtype=np.float32
+        )
+
+    return convert_category_column
+
+
+def convert_encoded_column(column: Sequence[Optional[str]]) -> np.ndarray:
+    return np.asarray(column, dtype=np.float32)
+
+
+def convert_boolean_column(column: Sequence[Optional[str]]) -> np.ndarray:
+    return np.array([value == "true" for value in column], dtype=np.float32)
+
+
+def convert_numeric_column(column: Sequence[Optional[str]]) -> np.ndarray:
+    return np.array(
+        [
+            (-1 if value == "*" else float(value)) if value is not None else 0
+            for value in column
+        ],
+        dtype=np.float32,
+    )
+
+
+def get_type_indices(metadata: DatasetMetadata) -> List[int]:
+    return [
+        index
+        for index, feature in enumerate(metadata["nodeFeatures"])
+        if feature[0] in metadata["typeAttributes"]
+    ]
+
+
+def split_types(x: np.ndarray, type_indices: List[int]) -> np.ndarray:
+    """
+    Removes the type attributes from the node features in-place and returns the labels.
+    The label of a node is its first non-zero type attribute.
+    Like the label, all type attributes up to and including it are zeroed.
+    """
+    if len(type_indices) == 0 or len(x) == 0:
+        return np.zeros(len(x), dtype=np.int64)
+    types = x[:, type_indices]
+    is_typed = types != 0
+    first_typed = np.argmax(is_typed, axis=1)
+    has_type = is_typed[np.arange(len(x)), first_typed]
+    y = np.where(has_type, types[np.arange(len(x)), first_typed], 0).astype(np.int64)
+    visited = np.arange(len(type_indices))[None, :] <= first_typed[:, None]
+    x[:, type_indices] = np.where(visited, 0, types)
+    return y
+
+
+def create_label_names(metadata: DatasetMetadata) -> List[Optional[str]]:
+    """
+    Creates a table from label indices to label names, with None for indices without a label.
+    """
+    label_names: List[Optional[str]] = ["None"]
+    label_feature = None
+    for feature in metadata["nodeFeatures"]:
+        if feature[0] in metadata["typeAttributes"]:
+            label_feature = feature
+            break
+    if label_feature is None or label_feature[2] is None:
+        return label_names
+    for key, value in label_feature[2].items():
+        if value >= len(label_names):
+            label_names.extend([None] * (value + 1 - len(label_names)))
+        if value != 0 and label_names[value] is None:
+            label_names[value] = key
+    return label_names
+
+
+def create_prediction_label_names(
+    metadata: DatasetMetadata, node_feature_fitter: FeatureFitter
+) -> List[Optional[str]]:
+    """
+    Creates a table from predicted label indices to label names.
+    Labels of raw type attributes are the codes of the fitted encoder, those of encoded ones are part of the metadata.
+    """
+    for feature_index, (feature_name, feature_type, _) in enumerate(
+        metadata["nodeFeatures"]
+    ):
+        if feature_name not in metadata["typeAttributes"]:
+            continue
+        if feature_type == "category" or feature_type == "string":
+            encoder = node_feature_fitter.get_encoder(feature_index)
+            return ["None", *encoder.categories]
+        break
+    return create_label_names(metadata)
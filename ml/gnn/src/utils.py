@@ -1,4 +1,5 @@
 import os
+import sys
 import time
 import torch
 from rich.align import Align
@@ -14,6 +15,11 @@ def pretty_duration(duration_seconds: int) -> str:
 
 script_dir = os.path.dirname(os.path.realpath(__file__))
 
+# Modules shared between the evaluations
+sys.path.append(os.path.realpath(f"{script_dir}/../../util"))
+from classification_metrics import ConfusionMatrix  # noqa: E402, F401
+from dataset_cache import DatasetCache, code_version  # noqa: E402, F401
+
 # Disable MPS due to limited implementation
 use_mps = False and torch.backends.mps.is_available() and torch.backends.mps.is_built()
 device = torch.device("mps" if use_mps else "cpu")
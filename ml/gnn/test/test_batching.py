@@ -0,0 +1,53 @@
+import os
+import sys
+
+import torch
+from torch_geometric.data import Data, InMemoryDataset
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from batching import GraphBatchSampler, create_batch_loader  # noqa: E402
+from model.gat import GATModel  # noqa: E402
+from model.gcn import GCNModel  # noqa: E402
+
+
+class GraphDataset(InMemoryDataset):
+    def __init__(self, graphs):
+        super().__init__(None)
+        self.data, self.slices = self.collate(graphs)
+
+
+def random_graphs(node_counts):
+    generator = torch.Generator().manual_seed(0)
+    return [
+        Data(
+            x=torch.randn(num_nodes, 4, generator=generator),
+            edge_index=torch.randint(
+                0, num_nodes, (2, 3 * num_nodes), generator=generator
+            ),
+            edge_attr=torch.randn(3 * num_nodes, 2, generator=generator),
+        )
+        for num_nodes in node_counts
+    ]
+
+
+def test_sampler_limits_graphs_and_nodes():
+    sampler = GraphBatchSampler([3, 4, 2, 10, 1, 1, 1], max_graphs=3, max_nodes=8)
+    # The graph with 10 nodes exceeds max_nodes on its own and forms a batch of its own
+    assert list(sampler) == [[0, 1], [2], [3], [4, 5, 6]]
+    assert list(GraphBatchSampler([3, 4, 2])) == [[0, 1, 2]]
+
+
+def test_batched_predictions_match_the_single_graphs():
+    dataset = GraphDataset(random_graphs([5, 12, 3, 8, 20, 1]))
+    torch.manual_seed(0)
+    models = [
+        GCNModel(4, 8, 3, layout=None).eval(),
+        GATModel(4, 2, 8, 3, layout=None).eval(),
+    ]
+    with torch.no_grad():
+        for model in models:
+            expected = torch.cat([model(data) for data in dataset])
+            batches = list(create_batch_loader(dataset, max_graphs=4, max_nodes=24))
+            assert len(batches) > 1
+            actual = torch.cat([model(batch) for batch in batches])
+            assert torch.allclose(actual, expected, atol=1e-5)
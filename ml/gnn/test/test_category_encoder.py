@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from category_encoder import CategoryEncoder  # noqa: E402
+
+
+def fit_encoder(categories) -> CategoryEncoder:
+    encoder = CategoryEncoder()
+    for category in categories:
+        encoder.fit(category)
+    encoder.freeze()
+    return encoder
+
+
+def test_codes_are_sorted_and_reserve_none_and_unknown():
+    encoder = fit_encoder(["Enum", "Class", None, "Class"])
+    assert encoder.transform(None) == 0
+    assert encoder.transform("Class") == 1
+    assert encoder.transform("Enum") == 2
+    assert encoder.transform("Package") == encoder.unknown_code == 3
+
+
+def test_codes_do_not_depend_on_the_fitting_order():
+    first = fit_encoder(["b", "a", "c"])
+    second = fit_encoder(["c", "b", "a"])
+    assert [first.transform(c) for c in "abcd"] == [second.transform(c) for c in "abcd"]
+
+
+def test_state_dict_round_trip():
+    encoder = fit_encoder(["Property", "Class", "Interface"])
+    restored = CategoryEncoder()
+    restored.load_state_dict(encoder.state_dict())
+    for category in [None, "Class", "Interface", "Property", "Unseen"]:
+        assert restored.transform(category) == encoder.transform(category)
+
+
+def test_file_round_trip(tmp_path):
+    encoder = fit_encoder(["Property", "Class", "Interface"])
+    path = str(tmp_path / "encoder.json")
+    encoder.save(path)
+    restored = CategoryEncoder.load(path)
+    assert restored.categories == encoder.categories
+    assert restored.unknown_code == encoder.unknown_code
+    for category in [None, "Class", "Interface", "Property", "Unseen"]:
+        assert restored.transform(category) == encoder.transform(category)
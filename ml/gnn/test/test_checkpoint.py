@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+import torch
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from checkpoint import CheckpointWriter  # noqa: E402
+from model.sgc import SGCModel  # noqa: E402
+
+
+def test_retention_keeps_last_and_best_checkpoints(tmp_path):
+    checkpoint_file = f"{tmp_path}/model.pt"
+    writer = CheckpointWriter(checkpoint_file, keep_last=1, keep_best=1)
+    for epoch, validation_loss in enumerate([3.0, 1.0, 2.0, 4.0]):
+        writer.submit(epoch, {"weight": torch.ones(1) * epoch}, validation_loss)
+    writer.close()
+    assert sorted(os.listdir(tmp_path)) == ["model.pt.1", "model.pt.3"]
+    assert torch.load(f"{checkpoint_file}.3")["weight"].item() == 3
+
+
+def test_close_returns_write_errors_without_raising(tmp_path):
+    writer = CheckpointWriter(f"{tmp_path}/missing/model.pt")
+    writer.submit(0, {}, 0.0)
+    assert writer.close(raise_errors=False) is not None
+
+    writer = CheckpointWriter(f"{tmp_path}/missing/model.pt")
+    writer.submit(0, {}, 0.0)
+    with pytest.raises(Exception):
+        writer.close()
+
+
+def test_fit_propagates_training_errors_over_writer_errors(tmp_path, monkeypatch):
+    model = SGCModel(2, 2, num_hops=1, hidden_channels=None, layout=None)
+    model.checkpoint_file = f"{tmp_path}/missing/SGC.pt"
+
+    def train_epochs(*args):
+        checkpoint_writer = args[5]
+        checkpoint_writer.submit(0, model.checkpoint(), 0.0)
+        checkpoint_writer.queue.join()
+        raise RuntimeError("training failed")
+
+    monkeypatch.setattr(model, "train_epochs", train_epochs)
+    with pytest.raises(RuntimeError, match="training failed"):
+        model.fit(None, None, num_epochs=1, patience=1)
+    assert "Writing a checkpoint failed" in model.layout_proxy.lines[-1]
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import torch
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from model.base_model import top_n_accuracy, weighted_accuracy  # noqa: E402
+
+
+def reference_top_n_accuracy(logits, labels, top_n_classes):
+    pred = torch.argmax(logits, dim=1)
+    correct_predictions = 0
+    top_n_correct_predictions = 0
+    top_n_prediction_count = 0
+    for i in range(len(pred)):
+        if labels[i] in top_n_classes:
+            top_n_prediction_count += 1
+        if pred[i] == labels[i]:
+            correct_predictions += 1
+            if labels[i] in top_n_classes:
+                top_n_correct_predictions += 1
+    return (
+        correct_predictions,
+        len(logits),
+        top_n_correct_predictions,
+        top_n_prediction_count,
+    )
+
+
+def reference_weighted_accuracy(logits, labels, weights):
+    weighted_correct_predictions = 0
+    total_weighted_predictions = 0
+    for i in range(len(logits)):
+        pred_index = None
+        max_value = float("-inf")
+        for j in range(len(logits[i])):
+            if logits[i][j] > max_value:
+                max_value = logits[i][j]
+                pred_index = j
+        total_weighted_predictions += weights[pred_index]
+        if pred_index == labels[i]:
+            weighted_correct_predictions += weights[pred_index]
+    return weighted_correct_predictions, total_weighted_predictions
+
+
+def random_predictions(num_nodes: int = 200, num_classes: int = 6):
+    generator = torch.Generator().manual_seed(0)
+    # Rounded, so that some nodes have ties, which both break towards the first class
+    logits = torch.randn(num_nodes, num_classes, generator=generator).round()
+    labels = torch.randint(0, num_classes, (num_nodes,), generator=generator)
+    return logits, labels
+
+
+def test_top_n_accuracy_matches_the_loop():
+    logits, labels = random_predictions()
+    top_n_classes = [0, 3, 4]
+    actual = top_n_accuracy(logits, labels, torch.tensor(top_n_classes))
+    expected = reference_top_n_accuracy(logits, labels, top_n_classes)
+    assert [int(value) for value in actual] == list(expected)
+
+
+def test_weighted_accuracy_matches_the_loop():
+    logits, labels = random_predictions()
+    weights = [0.5, 2.0, 0.0, 1.25, 3.0, 0.75]
+    actual = weighted_accuracy(
+        logits, labels, torch.tensor(weights, dtype=torch.float64)
+    )
+    expected = reference_weighted_accuracy(logits, labels, weights)
+    assert [float(value) for value in actual] == list(expected)
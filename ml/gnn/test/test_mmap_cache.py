@@ -0,0 +1,46 @@
+import os
+import sys
+
+import torch
+from torch_geometric.data import Data
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from mmap_cache import is_mmap_cache, load_mmap_cache, save_mmap_cache  # noqa: E402
+
+
+def test_round_trip(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    data = Data(
+        x=torch.tensor([[0.5, 1.0], [2.0, -3.25]], dtype=torch.bfloat16),
+        edge_index=torch.tensor([[0, 1], [1, 0]]),
+        edge_attr=torch.tensor([[3], [255]], dtype=torch.uint8),
+        y=torch.tensor([True, False]),
+        # Graphs without edge features still have an empty tensor
+        empty=torch.zeros(0, 4),
+    )
+    slices = {"x": torch.tensor([0, 1, 2]), "edge_index": torch.tensor([0, 1, 2])}
+    info = {"num_graphs": 2, "label_names": ["Class", "Enum"]}
+    assert not is_mmap_cache(cache_dir)
+    save_mmap_cache(cache_dir, data, slices, info)
+    assert is_mmap_cache(cache_dir)
+
+    loaded_data, loaded_slices, loaded_info = load_mmap_cache(cache_dir)
+    assert loaded_info == info
+    for key, value in data.to_dict().items():
+        assert loaded_data[key].dtype == value.dtype
+        assert loaded_data[key].shape == value.shape
+        assert torch.equal(loaded_data[key], value)
+    assert loaded_slices.keys() == slices.keys()
+    for key, value in slices.items():
+        assert torch.equal(loaded_slices[key], value)
+
+
+def test_save_replaces_an_existing_cache(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    save_mmap_cache(cache_dir, Data(x=torch.zeros(2, 2)), {}, {"version": 1})
+    save_mmap_cache(cache_dir, Data(y=torch.ones(3)), {}, {"version": 2})
+    data, _, info = load_mmap_cache(cache_dir)
+    assert info == {"version": 2}
+    assert "x" not in data
+    assert torch.equal(data.y, torch.ones(3))
+    assert os.listdir(tmp_path) == ["cache"]
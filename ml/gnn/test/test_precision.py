@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+import torch
+from torch_geometric.data import Data
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from precision import narrow_dtype, narrow_features, upcast_features  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "values, dtype",
+    [
+        ([[0.0, 1.0], [1.0, 0.0]], torch.uint8),
+        ([[-1.0, 3.0], [2.0, 0.0]], torch.int8),
+        ([[1000.0], [-2.0]], torch.int16),
+        ([[70000.0], [1.0]], torch.float32),
+        # Fractional features would lose precision in any narrower dtype
+        ([[3.0, 0.5], [200.0, 1.0]], torch.float32),
+        ([[0.1234567, 0.5], [0.125, 1.5]], torch.float32),
+    ],
+)
+def test_narrow_dtype(values, dtype):
+    assert narrow_dtype(torch.tensor(values)) == dtype
+
+
+def test_fractional_features_round_trip_exactly():
+    x = torch.tensor([[300.0, 0.1234567], [301.0, 1.0], [1000.0, 0.25]])
+    data = upcast_features(narrow_features(Data(x=x.clone())))
+    assert torch.equal(data.x, x)
+
+
+def test_integer_features_round_trip_exactly():
+    x = torch.tensor([[0.0, 5.0, -1.0], [1.0, 300.0, 2.0]])
+    edge_attr = torch.tensor([[1.0], [0.0]])
+    data = narrow_features(Data(x=x.clone(), edge_attr=edge_attr.clone()))
+    assert data.x.dtype == torch.int16
+    assert data.edge_attr.dtype == torch.uint8
+    data = upcast_features(data)
+    assert data.x.dtype == torch.float32
+    assert torch.equal(data.x, x)
+    assert torch.equal(data.edge_attr, edge_attr)
+
+
+def test_empty_and_integer_tensors_keep_their_dtype():
+    assert narrow_dtype(torch.zeros(0, 3)) == torch.float32
+    assert narrow_dtype(torch.tensor([[1, 2]])) == torch.int64
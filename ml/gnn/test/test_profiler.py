@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+import torch
+from torch_geometric.data import Data
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from profiler import TrainingProfiler  # noqa: E402
+from sampling import NeighborSampler  # noqa: E402
+
+
+def test_sampled_subgraphs_count_like_their_graph(tmp_path):
+    data = Data(x=torch.zeros(10, 1), edge_index=torch.randint(0, 10, (2, 30)))
+    profiler = TrainingProfiler(profile_file=f"{tmp_path}/profile.json")
+    profiler.start_epoch(0)
+    for subgraph in NeighborSampler([5, 5], batch_nodes=3).sample(data):
+        profiler.count(subgraph)
+    profiler.end_epoch()
+    (epoch,) = profiler.epochs
+    assert epoch["steps"] == 4
+    assert epoch["graphs"] == pytest.approx(1)
+    assert epoch["nodes"] == 10
+    assert epoch["edges"] == pytest.approx(30)
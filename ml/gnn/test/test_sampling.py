@@ -0,0 +1,56 @@
+import os
+import sys
+
+import torch
+from torch_geometric.data import Data
+from torch_geometric.nn import SAGEConv
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from sampling import NeighborSampler, num_seed_nodes  # noqa: E402
+
+
+def random_graph(num_nodes: int = 50, num_edges: int = 200) -> Data:
+    generator = torch.Generator().manual_seed(0)
+    return Data(
+        x=torch.randn(num_nodes, 4, generator=generator),
+        edge_index=torch.randint(0, num_nodes, (2, num_edges), generator=generator),
+        y=torch.arange(num_nodes),
+    )
+
+
+def test_seeds_come_first_and_cover_every_node_once():
+    data = random_graph()
+    seeds = []
+    for subgraph in NeighborSampler([3, 2], batch_nodes=8).sample(data, shuffle=True):
+        assert num_seed_nodes(subgraph) == subgraph.num_seed_nodes <= 8
+        assert subgraph.num_nodes >= subgraph.num_seed_nodes
+        # y holds the node ids, so the seeds are the first nodes of the subgraph
+        seeds.append(subgraph.y[: subgraph.num_seed_nodes])
+        assert len(subgraph.y.unique()) == subgraph.num_nodes
+        assert torch.equal(subgraph.x, data.x[subgraph.y])
+    assert torch.equal(torch.cat(seeds).sort().values, torch.arange(data.num_nodes))
+
+
+def test_unsampled_graphs_count_all_nodes():
+    assert num_seed_nodes(random_graph()) == 50
+
+
+def test_full_fan_out_matches_the_whole_graph_on_the_seeds():
+    data = random_graph()
+    torch.manual_seed(0)
+    layers = [SAGEConv(4, 8), SAGEConv(8, 3)]
+
+    def forward(graph: Data) -> torch.Tensor:
+        x = layers[0](graph.x, graph.edge_index).relu()
+        return layers[1](x, graph.edge_index)
+
+    with torch.no_grad():
+        expected = forward(data)
+        # Only the seeds have their whole two-hop neighborhood, the loss is restricted to them
+        sampled = torch.cat(
+            [
+                forward(subgraph)[: num_seed_nodes(subgraph)]
+                for subgraph in NeighborSampler([-1, -1], batch_nodes=7).sample(data)
+            ]
+        )
+    assert torch.allclose(sampled, expected, atol=1e-5)
@@ -0,0 +1,134 @@
+import http.client
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from base_predictor import BasePredictor  # noqa: E402
+from feature_transformer import FeatureTransformer  # noqa: E402
+from serve import LatencyStats, MicroBatcher, PredictionServer  # noqa: E402
+
+metadata = {
+    "nodeFeatures": [
+        ["type", "category", None],
+        ["isAbstract", "boolean", None],
+    ],
+    "edgeFeatures": [],
+    "idAttribute": "id",
+    "typeAttributes": ["type"],
+}
+
+
+class EchoPredictor:
+    name = "Echo"
+
+    def predict_batch(self, items):
+        return [
+            {"id": key, "nodes": [{"id": node} for node in entry["nodes"]]}
+            for key, entry in items
+        ]
+
+
+class UniformPredictor(BasePredictor):
+    """
+    Transforms the graphs like the real predictors and predicts all labels as equally likely.
+    """
+
+    def __init__(self):
+        entry = {
+            "list": [[0, 1]],
+            "nodes": ["a", "b"],
+            "nodeFeatureVectors": [["Class", "true"], ["Enum", None]],
+            "edgeFeatureVectors": [[]],
+        }
+        transformer = FeatureTransformer()
+        transformer.fit([entry], metadata)
+        super().__init__("Uniform", transformer.compile(metadata))
+
+    def predict_logits(self, arrays):
+        return np.zeros((len(arrays["x"]), len(self.label_names)), dtype=np.float32)
+
+
+class FailingPredictor:
+    name = "Failing"
+
+    def predict_batch(self, items):
+        raise RuntimeError("The model failed")
+
+
+def graph(*nodes):
+    return {"nodes": list(nodes)}
+
+
+def test_batcher_survives_malformed_requests():
+    batcher = MicroBatcher(EchoPredictor(), LatencyStats())
+    malformed = batcher.submit([("a", {"list": []})])
+    with pytest.raises(KeyError):
+        malformed.result(timeout=5)
+    valid = batcher.submit([("b", graph("n0", "n1"))])
+    assert valid.result(timeout=5) == [
+        {"id": "b", "nodes": [{"id": "n0"}, {"id": "n1"}]}
+    ]
+
+
+@pytest.fixture
+def server():
+    stats = LatencyStats()
+    batchers = {
+        predictor.name: MicroBatcher(predictor, stats)
+        for predictor in [EchoPredictor(), UniformPredictor(), FailingPredictor()]
+    }
+    server = PredictionServer(("127.0.0.1", 0), batchers, stats)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post(server, body: dict, model: str = "Echo") -> tuple[int, dict]:
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.request("POST", f"/predict?model={model}", json.dumps(body))
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_server_rejects_graphs_without_nodes(server):
+    status, body = post(server, {"data": {"a": {"list": []}}})
+    assert status == 400
+    assert "nodes" in body["error"]
+    status, body = post(server, {"data": {"b": graph("n0")}})
+    assert status == 200
+    assert body["predictions"] == [{"id": "b", "nodes": [{"id": "n0"}]}]
+
+
+def feature_graph(node_feature_vectors, edges=()):
+    return {
+        "list": list(edges),
+        "nodes": [f"n{index}" for index in range(len(node_feature_vectors))],
+        "nodeFeatureVectors": node_feature_vectors,
+        "edgeFeatureVectors": [[] for _ in edges],
+    }
+
+
+def test_server_rejects_graphs_that_do_not_match_the_metadata(server):
+    valid = feature_graph([["Class", "true"], ["Enum", "false"]], [[0, 1]])
+    short = feature_graph([["Class"], ["Enum"]])
+    dangling = feature_graph([["Class", "true"]], [[0, 3]])
+    for invalid in [short, dangling]:
+        status, body = post(server, {"data": {"a": invalid}}, model="Uniform")
+        assert status == 400
+        assert "Invalid graph" in body["error"]
+    status, body = post(server, {"data": {"b": valid}}, model="Uniform")
+    assert status == 200
+    assert [node["id"] for node in body["predictions"][0]["nodes"]] == ["n0", "n1"]
+
+
+def test_server_reports_model_failures_as_internal_errors(server):
+    status, body = post(server, {"data": {"a": graph("n0")}}, model="Failing")
+    assert status == 500
+    assert "The model failed" in body["error"]
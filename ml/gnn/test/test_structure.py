@@ -0,0 +1,37 @@
+import os
+import sys
+
+import torch
+from torch_geometric.data import Batch, Data
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from model.gat import GATModel  # noqa: E402
+from model.gcn import GCNModel  # noqa: E402
+from structure import precompute_structure  # noqa: E402
+
+
+def random_graph(num_nodes: int, seed: int) -> Data:
+    generator = torch.Generator().manual_seed(seed)
+    edge_index = torch.randint(0, num_nodes, (2, 4 * num_nodes), generator=generator)
+    # Existing self-loops are replaced, like GCNConv and GATConv do
+    edge_index[:, 0] = 0
+    return Data(
+        x=torch.randn(num_nodes, 4, generator=generator),
+        edge_index=edge_index,
+        edge_attr=torch.randn(edge_index.size(1), 2, generator=generator),
+    )
+
+
+def test_precomputed_structure_matches_the_convolutions():
+    graphs = [random_graph(num_nodes, seed) for seed, num_nodes in enumerate([6, 15])]
+    # Collated graphs offset the precomputed edge indices like edge_index
+    batch = Batch.from_data_list(
+        [precompute_structure(data.clone()) for data in graphs]
+    )
+    torch.manual_seed(0)
+    for model in [GCNModel(4, 8, 3, layout=None), GATModel(4, 2, 8, 3, layout=None)]:
+        model.eval()
+        with torch.no_grad():
+            expected = torch.cat([model(data) for data in graphs])
+            actual = model.use_precomputed_structure()(batch)
+        assert torch.allclose(actual, expected, atol=1e-5)
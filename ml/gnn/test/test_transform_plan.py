@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/../src"))
+from feature_transformer import FeatureTransformer  # noqa: E402
+from transform_plan import create_prediction_label_names  # noqa: E402
+
+metadata = {
+    "nodeFeatures": [
+        ["type", "category", {"Class": 1, "Interface": 2, "Enum": 3}],
+        ["isAbstract", "boolean", None],
+    ],
+    "edgeFeatures": [],
+    "idAttribute": "id",
+    "typeAttributes": ["type"],
+}
+
+entry = {
+    "format": "list",
+    "list": [[0, 1], [1, 2]],
+    "nodes": ["a", "b", "c"],
+    "nodeFeatureVectors": [
+        ["Interface", "true"],
+        ["Enum", "false"],
+        ["Class", None],
+    ],
+    "edgeFeatureVectors": [[], []],
+}
+
+
+def test_prediction_label_names_match_the_encoded_labels():
+    transformer = FeatureTransformer()
+    transformer.fit([entry], metadata)
+    (data,) = transformer.transform([entry], metadata)
+    label_names = create_prediction_label_names(
+        metadata, transformer.node_feature_fitter
+    )
+    # The encoder codes are sorted by name, unlike the codes of the metadata
+    assert [label_names[label] for label in data.y.tolist()] == [
+        "Interface",
+        "Enum",
+        "Class",
+    ]
+
+
+@pytest.mark.parametrize(
+    "feature_vectors",
+    [
+        [["Class"], ["Enum"]],
+        [["Class", "true", "false"], ["Enum", "false", "true"]],
+        [["Class", "true"], ["Enum"]],
+    ],
+    ids=["short", "long", "ragged"],
+)
+def test_transform_rejects_feature_vectors_of_the_wrong_length(feature_vectors):
+    transformer = FeatureTransformer()
+    transformer.fit([entry], metadata)
+    with pytest.raises(ValueError):
+        transformer.transform(
+            [{**entry, "nodeFeatureVectors": [*feature_vectors, ["Class", None]]}],
+            metadata,
+        )
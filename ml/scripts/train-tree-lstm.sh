@@ -1,7 +1,3 @@
-rm -f tree-lstm/.cache/tree_train.json.dataset
-rm -f tree-lstm/.cache/tree_validation.json.dataset
-rm -f tree-lstm/.cache/tree_test.json.dataset
-
 rm -rf .output/tree-lstm
 mkdir -p .output/tree-lstm
 
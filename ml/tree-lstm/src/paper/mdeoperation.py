@@ -8,8 +8,6 @@ import random
 import sys
 import time
 from typing import Union
-import numpy as np
-from sklearn.metrics import classification_report
 import torch
 
 from torch import cuda
@@ -17,7 +15,7 @@ from torch.nn.utils import clip_grad_norm_
 
 import paper.data_utils as data_utils
 import paper.network as network
-from utils import script_dir
+from utils import ConfusionMatrix, script_dir
 
 MISSING_PREDICTION = "MISSING_PREDICTION"
 
@@ -151,8 +149,7 @@ def evaluate(
     test_loss = 0
     tot_trees = len(test_dataset)
     res = []
-    predictions = []
-    labels = []
+    confusion_matrix = ConfusionMatrix()
 
     for idx in range(0, len(test_dataset), args.batch_size):
         encoder_inputs, decoder_inputs = model.get_batch(test_dataset, start_idx=idx)
@@ -201,19 +198,16 @@ def evaluate(
 
             # remove first item from current_target, as it's the root note
             label = current_target_print
-            labels.extend(label)
             # extends predictions with current_output, but ensure length matches to len(current_target)
             shortened_output = current_output_print[: len(label)]
             padded_output = shortened_output + [MISSING_PREDICTION] * (
                 len(label) - len(shortened_output)
             )
-            predictions.extend(padded_output)
+            confusion_matrix.update_named(label, padded_output)
 
     test_loss /= tot_trees
     print("  test: loss %.2f" % test_loss)
-    report = classification_report(
-        labels, predictions, output_dict=True, zero_division=np.nan
-    )
+    report = confusion_matrix.report()
     print(
         "  test: accuracy of classification %.2f" % (report["accuracy"] * 100)
     )
@@ -7,16 +7,24 @@ from typing import Union
 import torch
 import torch.utils
 from tree_dataset_types import TreeDatasetEntry, TreeModel, TreeNode
-from utils import pretty_duration, script_dir
+from utils import DatasetCache, code_version, pretty_duration, script_dir
 
 SIZE_LIMIT = 1000
 
+# Cached datasets are invalidated whenever one of these modules changes
+cache_version = code_version(
+    [f"{script_dir}/{module}.py" for module in ["tree_dataset", "tree_dataset_types"]]
+)
+
 
 class TreeDataset(torch.utils.data.Dataset):
     def __init__(self, name: str, dataset_file: str) -> None:
         self.name = name
         self.dataset_path = f"{script_dir}/../../.input/{dataset_file}"
-        self.dataset_cache_file = f"{script_dir}/../.cache/{dataset_file}.dataset"
+        self.dataset_cache = DatasetCache(f"{script_dir}/../.cache", cache_version)
+        self.dataset_cache_file = self.dataset_cache.entry_path(
+            self.dataset_path, ".dataset"
+        )
         self.data: list[TreeDatasetEntry] = []
         self.omitted_trees = 0
 
@@ -47,6 +55,7 @@ class TreeDataset(torch.utils.data.Dataset):
                     (self.data, self.metadata, self.vocabulary, self.omitted_trees),
                     self.dataset_cache_file,
                 )
+        self.dataset_cache.mark_used(self.dataset_cache_file)
 
         dataset_load_end_time = time.perf_counter()
         print(
@@ -0,0 +1,113 @@
+from typing import Hashable, Sequence
+
+import numpy as np
+
+report_metrics = ["precision", "recall", "f1-score"]
+
+
+class ConfusionMatrix:
+    """
+    Accumulates predictions batch by batch into a confusion matrix, with true labels as rows
+    and predicted labels as columns. The report has the shape of sklearn's
+    classification_report(output_dict=True, zero_division=np.nan).
+    """
+
+    def __init__(self, num_classes: int = 0):
+        self.matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        # Named labels are assigned indices in the order they are first seen
+        self.label_indices: dict[Hashable, int] = {}
+
+    def update(self, labels, predictions) -> None:
+        labels = np.asarray(labels, dtype=np.int64).reshape(-1)
+        predictions = np.asarray(predictions, dtype=np.int64).reshape(-1)
+        if len(labels) != len(predictions):
+            raise ValueError(
+                f"Got {len(labels)} labels, but {len(predictions)} predictions"
+            )
+        if len(labels) == 0:
+            return
+        num_classes = max(
+            len(self.matrix), int(labels.max()) + 1, int(predictions.max()) + 1
+        )
+        self.grow(num_classes)
+        self.matrix += np.bincount(
+            labels * num_classes + predictions, minlength=num_classes * num_classes
+        ).reshape(num_classes, num_classes)
+
+    def update_named(
+        self, labels: Sequence[Hashable], predictions: Sequence[Hashable]
+    ) -> None:
+        self.update(
+            [self.get_label_index(label) for label in labels],
+            [self.get_label_index(prediction) for prediction in predictions],
+        )
+
+    def get_label_index(self, label: Hashable) -> int:
+        index = self.label_indices.get(label)
+        if index is None:
+            index = len(self.label_indices)
+            self.label_indices[label] = index
+        return index
+
+    def grow(self, num_classes: int) -> None:
+        if num_classes <= len(self.matrix):
+            return
+        matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        matrix[: len(self.matrix), : len(self.matrix)] = self.matrix
+        self.matrix = matrix
+
+    def report(self) -> dict:
+        true_counts = self.matrix.sum(axis=1)
+        predicted_counts = self.matrix.sum(axis=0)
+        correct_counts = np.diag(self.matrix)
+        total = int(true_counts.sum())
+        # Like sklearn, only labels that occur as true label or prediction are reported
+        present = np.flatnonzero(true_counts + predicted_counts)
+        if self.label_indices:
+            names = {index: name for name, index in self.label_indices.items()}
+            present = np.array(
+                sorted(present, key=lambda index: names[index]), dtype=np.int64
+            )
+            label_names = [str(names[index]) for index in present]
+        else:
+            label_names = [str(index) for index in present]
+        support = true_counts[present]
+        scores = {
+            "precision": divide(correct_counts[present], predicted_counts[present]),
+            "recall": divide(correct_counts[present], support),
+            "f1-score": divide(
+                2 * correct_counts[present], support + predicted_counts[present]
+            ),
+        }
+        report = {}
+        for position, label_name in enumerate(label_names):
+            report[label_name] = {
+                **{metric: float(scores[metric][position]) for metric in report_metrics},
+                "support": float(support[position]),
+            }
+        report["accuracy"] = float(correct_counts.sum() / total) if total > 0 else 0.0
+        report["macro avg"] = {
+            **{metric: nanaverage(scores[metric]) for metric in report_metrics},
+            "support": float(total),
+        }
+        report["weighted avg"] = {
+            **{metric: nanaverage(scores[metric], support) for metric in report_metrics},
+            "support": float(total),
+        }
+        return report
+
+
+def divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    result = np.full(len(numerator), np.nan)
+    defined = denominator != 0
+    result[defined] = numerator[defined] / denominator[defined]
+    return result
+
+
+def nanaverage(values: np.ndarray, weights: np.ndarray | None = None) -> float:
+    defined = ~np.isnan(values)
+    if not defined.any():
+        return float("nan")
+    if weights is None or weights[defined].sum() == 0:
+        return float(np.mean(values[defined]))
+    return float(np.average(values[defined], weights=weights[defined]))
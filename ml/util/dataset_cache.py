@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from typing import Optional
+
+# Can be overridden with the CM2ML_CACHE_MAX_BYTES environment variable
+default_max_bytes = 16 * 1024**3
+
+content_hash_file_name = "content-hashes.json"
+entry_pattern = re.compile(r"^.+\.[0-9a-f]{16}\.[a-z]+$")
+# Temporary files and directories of interrupted builds, named <entry or file>.tmp-<pid>
+tmp_pattern = re.compile(r"^.+\.tmp-[0-9]+$")
+# Temporary files that were not modified for this long are assumed to be left behind
+stale_tmp_seconds = 24 * 3600
+
+
+def code_version(source_files: list[str]) -> str:
+    digest = hashlib.sha256()
+    for source_file in sorted(source_files):
+        with open(source_file, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """
+    Cache entries are keyed on the content of the input file, the version of the code that
+    produced them, and an optional variant. Least recently used entries are evicted once the
+    total size of all entries exceeds the byte budget.
+    """
+
+    def __init__(self, cache_dir: str, version: str, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(os.environ.get("CM2ML_CACHE_MAX_BYTES", default_max_bytes))
+        )
+
+    def entry_path(self, input_path: str, suffix: str, variant: str = "") -> str:
+        key = hashlib.sha256(
+            f"{self.content_hash(input_path)}:{self.version}:{variant}".encode()
+        ).hexdigest()[:16]
+        return f"{self.cache_dir}/{os.path.basename(input_path)}.{key}{suffix}"
+
+    def mark_used(self, entry_path: str) -> None:
+        if os.path.exists(entry_path):
+            os.utime(entry_path)
+        self.evict(protected=entry_path)
+
+    def evict(self, protected: Optional[str] = None) -> list[str]:
+        entries = []
+        evicted = []
+        for name in os.listdir(self.cache_dir):
+            path = f"{self.cache_dir}/{name}"
+            if tmp_pattern.match(name):
+                if is_stale(path):
+                    remove_entry(path)
+                    evicted.append(path)
+                continue
+            if not entry_pattern.match(name) or path == protected:
+                continue
+            try:
+                entries.append((os.path.getmtime(path), entry_size(path), path))
+            except FileNotFoundError:
+                # Removed concurrently by another run
+                continue
+        total_size = sum(size for _, size, _ in entries)
+        if protected is not None and os.path.exists(protected):
+            total_size += entry_size(protected)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            remove_entry(path)
+            total_size -= size
+            evicted.append(path)
+        if len(evicted) > 0:
+            self.prune_content_hashes()
+        return evicted
+
+    def prune_content_hashes(self) -> None:
+        # Digests of inputs without any remaining entry are dropped, so that the file does not grow without bound
+        input_names = {
+            name.rsplit(".", 2)[0]
+            for name in os.listdir(self.cache_dir)
+            if entry_pattern.match(name)
+        }
+        content_hashes = self.read_content_hashes()
+        remaining = {
+            real_path: known
+            for real_path, known in content_hashes.items()
+            if known.get("name", os.path.basename(real_path)) in input_names
+        }
+        if len(remaining) < len(content_hashes):
+            self.write_content_hashes(remaining)
+
+    def content_hash(self, input_path: str) -> str:
+        # Hashing large inputs is expensive, so digests are reused while size and mtime are unchanged
+        real_path = os.path.realpath(input_path)
+        stat = os.stat(real_path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        content_hashes = self.read_content_hashes()
+        known = content_hashes.get(real_path)
+        if known is not None and known["stamp"] == stamp:
+            return known["digest"]
+        digest = hashlib.sha256()
+        with open(real_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        content_hashes[real_path] = {
+            "stamp": stamp,
+            "digest": digest.hexdigest(),
+            # Name of the entries of this input, which may differ from the real path for symlinks
+            "name": os.path.basename(input_path),
+        }
+        self.write_content_hashes(content_hashes)
+        return digest.hexdigest()
+
+    def read_content_hashes(self) -> dict:
+        try:
+            with open(f"{self.cache_dir}/{content_hash_file_name}", "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write_content_hashes(self, content_hashes: dict) -> None:
+        tmp_file = f"{self.cache_dir}/{content_hash_file_name}.tmp-{os.getpid()}"
+        with open(tmp_file, "w") as file:
+            json.dump(content_hashes, file)
+        os.replace(tmp_file, f"{self.cache_dir}/{content_hash_file_name}")
+
+
+def entry_size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            size += os.path.getsize(os.path.join(root, file))
+    return size
+
+
+def is_stale(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) > stale_tmp_seconds
+    except FileNotFoundError:
+        # Completed concurrently by another run
+        return False
+
+
+def remove_entry(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,52 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.metrics import classification_report
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/.."))
+from classification_metrics import ConfusionMatrix  # noqa: E402
+
+
+def assert_reports_equal(actual: dict, expected: dict):
+    assert list(actual.keys()) == list(expected.keys())
+    for key, expected_value in expected.items():
+        if isinstance(expected_value, dict):
+            assert_reports_equal(actual[key], expected_value)
+        elif math.isnan(expected_value):
+            assert math.isnan(actual[key])
+        else:
+            assert actual[key] == pytest.approx(expected_value)
+
+
+def test_report_matches_sklearn_across_batches():
+    random = np.random.default_rng(0)
+    # Class 5 is only predicted and class 6 only occurs as label, so some scores are undefined
+    labels = np.concatenate([random.integers(0, 5, 200), [6, 6]])
+    predictions = np.concatenate([random.integers(0, 6, 200), [0, 1]])
+    confusion_matrix = ConfusionMatrix()
+    for batch in np.array_split(np.arange(len(labels)), 7):
+        confusion_matrix.update(labels[batch], predictions[batch])
+    expected = classification_report(
+        labels, predictions, output_dict=True, zero_division=np.nan
+    )
+    assert_reports_equal(confusion_matrix.report(), expected)
+
+
+def test_named_report_matches_sklearn():
+    labels = ["Class", "Enum", "Class", "Package", "Property", "Class"]
+    predictions = ["Class", "Class", "Enum", "Package", "Interface", "Class"]
+    confusion_matrix = ConfusionMatrix()
+    confusion_matrix.update_named(labels[:3], predictions[:3])
+    confusion_matrix.update_named(labels[3:], predictions[3:])
+    expected = classification_report(
+        labels, predictions, output_dict=True, zero_division=np.nan
+    )
+    assert_reports_equal(confusion_matrix.report(), expected)
+
+
+def test_update_rejects_mismatched_lengths():
+    with pytest.raises(ValueError):
+        ConfusionMatrix().update([0, 1], [0])
@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.realpath(f"{os.path.dirname(__file__)}/.."))
+from dataset_cache import DatasetCache, content_hash_file_name  # noqa: E402
+
+
+def write_input(path: str, content: str) -> str:
+    with open(path, "w") as file:
+        file.write(content)
+    return path
+
+
+def write_entry(path: str, size: int) -> None:
+    with open(path, "wb") as file:
+        file.write(b"0" * size)
+
+
+def read_content_hashes(cache_dir: str) -> dict:
+    with open(f"{cache_dir}/{content_hash_file_name}", "r") as file:
+        return json.load(file)
+
+
+def test_entry_path_depends_on_content_version_and_variant(tmp_path):
+    input_file = write_input(f"{tmp_path}/train.json", "a")
+    cache = DatasetCache(str(tmp_path), "v1")
+    entry = cache.entry_path(input_file, ".dataset")
+    assert entry == cache.entry_path(input_file, ".dataset")
+    assert entry != cache.entry_path(input_file, ".dataset", "variant")
+    assert entry != DatasetCache(str(tmp_path), "v2").entry_path(input_file, ".dataset")
+    write_input(input_file, "b")
+    assert entry != cache.entry_path(input_file, ".dataset")
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    cache = DatasetCache(str(tmp_path), "v1", max_bytes=150)
+    old_entry = f"{tmp_path}/old.json.{'0' * 16}.dataset"
+    new_entry = f"{tmp_path}/new.json.{'1' * 16}.dataset"
+    write_entry(old_entry, 100)
+    write_entry(new_entry, 100)
+    os.utime(old_entry, (0, 0))
+    cache.mark_used(new_entry)
+    assert not os.path.exists(old_entry)
+    assert os.path.exists(new_entry)
+
+
+def test_evict_prunes_content_hashes_of_evicted_inputs(tmp_path):
+    input_dir = tmp_path / "input"
+    cache_dir = tmp_path / "cache"
+    input_dir.mkdir()
+    cache_dir.mkdir()
+    cache = DatasetCache(str(cache_dir), "v1", max_bytes=150)
+    old_input = write_input(f"{input_dir}/old.json", "old")
+    new_input = write_input(f"{input_dir}/new.json", "new")
+    old_entry = cache.entry_path(old_input, ".dataset")
+    new_entry = cache.entry_path(new_input, ".dataset")
+    write_entry(old_entry, 100)
+    write_entry(new_entry, 100)
+    os.utime(old_entry, (0, 0))
+    assert len(read_content_hashes(str(cache_dir))) == 2
+    cache.mark_used(new_entry)
+    assert list(read_content_hashes(str(cache_dir))) == [os.path.realpath(new_input)]
+
+
+def test_evict_removes_stale_temporary_entries(tmp_path):
+    cache = DatasetCache(str(tmp_path), "v1", max_bytes=1000)
+    stale_dir = f"{tmp_path}/old.json.{'0' * 16}.mmap.tmp-123"
+    fresh_dir = f"{tmp_path}/new.json.{'1' * 16}.mmap.tmp-456"
+    for tmp_dir in [stale_dir, fresh_dir]:
+        os.makedirs(tmp_dir)
+        write_entry(f"{tmp_dir}/x.bin", 10)
+    os.utime(stale_dir, (0, 0))
+    assert cache.evict() == [stale_dir]
+    assert not os.path.exists(stale_dir)
+    # Builds that may still be running are kept
+    assert os.path.exists(fresh_dir)